@@ -0,0 +1,59 @@
+"""
+Times simpledict.dicts_to_list against the old defaultdict-based version on
+dense dicts (every key in every dict) and sparse ones (a key missing from
+every other dict), in row- and column-major form.
+
+usage: python -m benchmarks.bench_dicts_to_list [dicts]
+"""
+import sys
+import time
+from collections import defaultdict
+
+from simpleutils import simpledict
+from simpleutils.simplesets import get_all_keys
+
+def old_dicts_to_list(lstofdicts, fieldnames=None, key_sorter=None,
+        ignore_keys=None):
+    """ dicts_to_list as it was: key scan, then a defaultdict of rows filled
+    cell by cell"""
+    all_names = set(get_all_keys(lstofdicts))
+    fieldnames = simpledict.merge_fieldnames(all_names, fieldnames,
+            key_sorter, ignore_keys)
+    output = defaultdict(lambda : [None] * len(fieldnames))
+    for row, dct in enumerate(lstofdicts):
+        curr = output[row]
+        for i, k in enumerate(fieldnames):
+            try:
+                curr[i] = dct[k]
+            except KeyError:
+                pass
+    output = [output[k] for k in range(max(output.keys()) + 1)]
+    return fieldnames, output
+
+def make_dicts(n, sparse=False):
+    dicts = [dict(id=i, name='name', amount=1.5, flag=True, note=None,
+                  code=i % 7) for i in xrange(n)]
+    if sparse:
+        for d in dicts[::2]:
+            del d['note']
+    return dicts
+
+def timed(fn, *args, **kwargs):
+    start = time.time()
+    fn(*args, **kwargs)
+    return time.time() - start
+
+def main(n=1000000):
+    for sparse in (False, True):
+        dicts = make_dicts(n, sparse)
+        print("%d %s dicts" % (n, 'sparse' if sparse else 'dense'))
+        old = timed(old_dicts_to_list, dicts)
+        print("  old dicts_to_list:           %6.2fs" % old)
+        t = timed(simpledict.dicts_to_list, dicts)
+        print("  dicts_to_list:               %6.2fs (%.2fx)" % (t, old / t))
+        t = timed(simpledict.dicts_to_list, dicts, column_major=True)
+        print("  dicts_to_list(column_major): %6.2fs (%.2fx)" % (t, old / t))
+        del dicts
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
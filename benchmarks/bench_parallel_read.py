@@ -0,0 +1,44 @@
+"""
+Times simplecsv.read_to_list against read_to_list_parallel with a growing
+number of worker processes.
+
+usage: python -m benchmarks.bench_parallel_read [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from simpleutils import simplecsv as sc
+
+def make_file(rows):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'wb') as f:
+        f.write('id,name,amount,note\r\n')
+        for i in xrange(rows):
+            f.write('%d,name %d,%d.%02d,"quoted, with\r\nnewline"\r\n'
+                    % (i, i, i, i % 100))
+    return path
+
+def timed(fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    return time.time() - start, len(result)
+
+def main(rows=500000):
+    path = make_file(rows)
+    try:
+        print("%d rows, %d bytes" % (rows, os.path.getsize(path)))
+        serial, n = timed(sc.read_to_list, path)
+        print("read_to_list:              %6.2fs (%d rows)" % (serial, n))
+        processes = 1
+        while processes <= max(2, sc.multiprocessing.cpu_count()):
+            t, n = timed(sc.read_to_list_parallel, path, processes=processes)
+            print("read_to_list_parallel(%2d): %6.2fs (%d rows, %.2fx)"
+                    % (processes, t, n, serial / t))
+            processes *= 2
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
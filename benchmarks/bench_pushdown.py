@@ -0,0 +1,45 @@
+"""
+Times read-then-filter against simplecsv.read_to_dict with usecols/where
+pushdown, on a wide file where three columns and ~5% of rows are wanted.
+
+usage: python -m benchmarks.bench_pushdown [rows] [columns]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from simpleutils import simplecsv as sc
+
+def make_file(rows, columns):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    names = ['col%d' % i for i in range(columns)]
+    with os.fdopen(fd, 'wb') as f:
+        f.write(','.join(names) + '\r\n')
+        for i in xrange(rows):
+            f.write(','.join(str(i * j % 100) for j in range(columns)) + '\r\n')
+    return path
+
+def read_then_filter(path, usecols, column, limit):
+    return [dict((k, d[k]) for k in usecols) for d in sc.read_to_dict(path)
+            if float(d[column]) < limit]
+
+def pushdown(path, usecols, column, limit):
+    return sc.read_to_dict(path, usecols=usecols, where=(column, '<', limit))
+
+def main(rows=100000, columns=80):
+    path = make_file(rows, columns)
+    usecols = ['col1', 'col2', 'col3']
+    try:
+        print("%d rows x %d columns, keeping %r where col1 < 5"
+                % (rows, columns, usecols))
+        for fn in (read_then_filter, pushdown):
+            start = time.time()
+            result = fn(path, usecols, 'col1', 5)
+            print("%-17s %6.2fs (%d rows)" % (fn.__name__ + ':',
+                time.time() - start, len(result)))
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,55 @@
+"""
+Compares the memory used by rows held as a list of dicts and as a
+simpledict.RecordTable. Each variant is built in a fresh interpreter and
+measured by the growth of its peak resident set size.
+
+usage: python -m benchmarks.bench_recordtable [rows]
+"""
+import resource
+import subprocess
+import sys
+import time
+
+from simpleutils.simpledict import RecordTable
+
+MODULE = 'benchmarks.bench_recordtable'
+
+def make_dicts(n):
+    for i in xrange(n):
+        yield dict(id=i, amount=i * 0.25, quantity=i % 100, score=i / 3.0,
+                   code='abc'[i % 3])
+
+def peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def child(kind, n):
+    """ builds one variant and prints its memory (kB) and build time"""
+    before = peak_kb()
+    start = time.time()
+    if kind == 'dicts':
+        rows = list(make_dicts(n))
+    else:
+        rows = RecordTable.from_dicts(make_dicts(n))
+    elapsed = time.time() - start
+    print("%d %f" % (peak_kb() - before, elapsed))
+    del rows
+
+def measure(kind, n):
+    out = subprocess.check_output([sys.executable, '-m', MODULE,
+        '--child', kind, str(n)])
+    kb, elapsed = out.split()
+    return int(kb), float(elapsed)
+
+def main(n=1000000):
+    print("%d rows of 5 fields" % n)
+    dicts_kb, t = measure('dicts', n)
+    print("list of dicts: %8d kB (%.2fs)" % (dicts_kb, t))
+    table_kb, t = measure('table', n)
+    print("RecordTable:   %8d kB (%.2fs, %.1fx less memory)"
+            % (table_kb, t, float(dicts_kb) / max(table_kb, 1)))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""
+Times writing many sheets into one workbook: simplexls.write_dict called once
+per sheet with a shared workbook (which saves the workbook every call) against
+a single simplexls.write_workbook call with a growing number of worker
+processes.
+
+usage: python -m benchmarks.bench_workbook [sheets] [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from StringIO import StringIO
+
+from simpleutils import simplexls as sx
+
+HEADER = sx.Style()
+HEADER.font.bold = True
+
+def make_sheets(sheets, rows):
+    return OrderedDict(('sheet%d' % k,
+        [dict(id=i, name='name %d' % i, amount=i * 1.5, flag=i % 2 == 0)
+         for i in xrange(rows)]) for k in xrange(sheets))
+
+def per_sheet(sheets, path):
+    wb = None
+    for name, rows in sheets.items():
+        ws = sx.write_dict(rows, path, sheet_name=name, workbook=wb,
+                style_dict={'1:1': HEADER})
+        wb = ws.parent
+
+def timed(fn, *args, **kwargs):
+    # write_dict and dicts_to_list (used by write_workbook too) print the
+    # fieldnames they find, keep that out of the results
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        start = time.time()
+        fn(*args, **kwargs)
+        return time.time() - start
+    finally:
+        sys.stdout = stdout
+
+def main(sheets=20, rows=2000):
+    data = make_sheets(sheets, rows)
+    options = dict((name, {'style_dict': {'1:1': HEADER}}) for name in data)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        print("%d sheets x %d rows" % (sheets, rows))
+        loop = timed(per_sheet, data, path)
+        print("write_dict per sheet:    %6.2fs" % loop)
+        processes = 1
+        while processes <= max(2, sx.multiprocessing.cpu_count()):
+            t = timed(sx.write_workbook, data, path, sheet_options=options,
+                    processes=processes)
+            print("write_workbook(%2d):      %6.2fs (%.2fx)"
+                    % (processes, t, loop / t))
+            processes *= 2
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -8,6 +8,13 @@ For all functions:
 some common keywords are listed for convenience. Only non-None
 keywords are passed.
 
+All readers and writers take a ``progress`` keyword (silent by default),
+see :mod:`~simpleutils.simpleprogress`. Compressed files ('.csv.gz' etc.)
+are read and written transparently. The ``compression``, ``compresslevel``,
+``buffering``, ``atomic`` and ``fsync`` keywords are passed to
+:func:`.simplefile.get_fileobject`; with ``atomic=True`` a writer that fails
+leaves any existing file untouched.
+
 Convert to csv:
 ================
 
@@ -26,16 +33,47 @@ where path is a path to a csv file and ABC is 'list' or 'dict'.
 All keywords for python csv module are accepted, also possible to
 specify a header row to get titles/keys, etc
 
+iter_ABC(path) is the streaming version of read_to_ABC: it takes the same
+keywords but yields rows one at a time instead of building a list.
+read_to_list_parallel/iter_lists_parallel parse big files on several cores.
+MappedCSV gives random access to the rows of a file without parsing the
+rest of it.
+read_typed/iter_typed convert values to Python types, see
+:mod:`~simpleutils.simpletypes`, and read_columns loads a file into compact
+per-column arrays.
+
 All functions work with lists, dicts, or any object that works similarly
 """
 
 
 
+import cPickle as pickle
 import csv
-from .simplesets import get_all_keys
-from .simplefile import get_fileobject
+import io
+import mmap
+import multiprocessing
+import operator
+import os
+import struct
+import tempfile
+from array import array
+from collections import OrderedDict
+from itertools import chain, islice, izip
+from operator import itemgetter
+from .simplesets import get_all_keys, sample_keys
+from .simpledict import RecordTable
+from .simplefile import (get_fileobject, pop_file_options,
+        detect_compression, discard_fileobject)
+from .simpleprogress import get_progress, tell
+from . import simpletypes
 import sys
 
+# numpy is optional, used by read_columns if available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def convert_dict_to_csv(
         *args, **kwargs):
@@ -48,6 +86,7 @@ def write_dict(
         header_row = None,
         fieldnames = None,
         dialect='excel',
+        progress = None,
         **kwargs):
     """Takes dict and converts to csv, see csv.DictWriter for more,
     ``**kwargs`` are passed on, default filename is
@@ -56,20 +95,33 @@ def write_dict(
     restval=None[, dialect='excel'[, *args, **kwds]]]]])`` Use keyword
     arguments so you don't have to worry about position.
 
-    :param lstofdicts: list of dicts to be converted to csv
+    :param lstofdicts: list of dicts (or a
+        :class:`~.simpledict.RecordTable`) to be converted to csv
     :param filename: path/fileobject/None for storing csv. See
         :func:`.simplefile.get_fileobject` for more.
     :param integer header_row: if given, pops that item in the list of
         of ``lstofdicts`` and uses it as headers (assumes it has a
         :meth:`keys` method.
+    :param progress: progress hook, see :func:`.simpleprogress.get_progress`
 
+    If ``lstofdicts`` is a generator (or any other non-indexable iterable)
+    it is handed over to :func:`write_dict_stream`.
     """
+    if not hasattr(lstofdicts, '__getitem__'):
+        # generators/iterators can't be indexed or scanned twice
+        return write_dict_stream(lstofdicts, filename=filename,
+                fieldnames=fieldnames, dialect=dialect, progress=progress,
+                **kwargs)
+    progress = get_progress(progress, 'write_dict')
     # store defaults in kwargs
-    f = get_fileobject(filename,mode='wb',ext='.csv')
+    f = get_fileobject(filename,mode='wb',ext='.csv',
+            **pop_file_options(kwargs))
     try:
         if fieldnames:
             # if fieldnames, store them
             names = fieldnames
+        elif isinstance(lstofdicts, RecordTable):
+            names = list(lstofdicts.fieldnames)
         elif header_row:
             # sort keys in header_row for fieldnames
             names = sorted(lstofdicts[header_row].keys())
@@ -86,22 +138,164 @@ def write_dict(
         # write fieldnames as first row
         csvwriter = csv.writer(f, **kwargs)
         csvwriter.writerow(names)
-        # add fieldnames to kwargs for dictwriter
-        kwargs['fieldnames'] = names
-        csvDict = csv.DictWriter(f, **kwargs)
-        sys.stdout.write("Wrote field names to first row. Continuing")
-        i = 0
-        for elem in lstofdicts:
-            i += 1
-            sys.stdout.write('.')
-            csvDict.writerow(elem)
-        print ("\nWrote {!d} items".format(i))
-    except Exception as inst:
-        print inst.message
-        print inst.args
+        if isinstance(lstofdicts, RecordTable):
+            # straight from the columns, no dict per row
+            _write_rows(csvwriter, lstofdicts.rows(names), f, progress)
+        else:
+            # add fieldnames to kwargs for dictwriter
+            kwargs['fieldnames'] = names
+            csvDict = csv.DictWriter(f, **kwargs)
+            _write_rows(csvDict, lstofdicts, f, progress)
+        if progress is not None:
+            progress.finish(tell(f))
+    except:
+        discard_fileobject(f)
+        raise
     finally:
         f.close()
-        return filename
+    return filename
+
+def write_dict_stream(
+        dicts,
+        filename = None,
+        fieldnames = None,
+        schema = None,
+        sample_size = 1000,
+        batch_size = 1000,
+        restval = '',
+        extrasaction = 'ignore',
+        dialect = 'excel',
+        progress = None,
+        **kwargs):
+    """Single-pass version of :func:`write_dict` for any iterable of dicts
+    (generators included). Rows are converted to lists and written in
+    batches of ``batch_size`` through :meth:`csv.writer.writerows`.
+
+    :param schema: how to find the columns when ``fieldnames`` is not given:
+
+        * ``'sample'`` - sorted keys of the first ``sample_size`` dicts
+        * ``'spill'`` (default) - sorted keys of *all* dicts (same output as
+          :func:`write_dict`). Rows are spilled to a temporary file while keys
+          are discovered and the header is written once the input is done.
+
+    :param restval: written for keys missing from a dict
+    :param extrasaction: ``'ignore'`` drops keys that are not in the
+        fieldnames, ``'raise'`` raises ValueError (as :class:`csv.DictWriter`)
+    :param filename: path/fileobject/None, see
+        :func:`.simplefile.get_fileobject`
+    :param progress: progress hook, see :func:`.simpleprogress.get_progress`
+
+    Other keywords are passed to :func:`csv.writer`. Returns the filename
+    written to.
+    """
+    if extrasaction not in ('ignore', 'raise'):
+        raise ValueError("extrasaction must be 'ignore' or 'raise', not %r"
+                % extrasaction)
+    if schema is None:
+        schema = 'spill'
+    elif schema not in ('sample', 'spill'):
+        raise ValueError("schema must be 'sample' or 'spill', not %r" % schema)
+    kwargs['dialect'] = dialect
+    progress = get_progress(progress, 'write_dict_stream')
+    f = get_fileobject(filename,mode='wb',ext='.csv',
+            **pop_file_options(kwargs))
+    try:
+        csvwriter = csv.writer(f, **kwargs)
+        if fieldnames is None and schema == 'spill':
+            _write_spilled(csvwriter, dicts, restval, batch_size, f, progress)
+        else:
+            if fieldnames is None:
+                keys, dicts = sample_keys(dicts, sample_size)
+                fieldnames = sorted(keys)
+            csvwriter.writerow(fieldnames)
+            rows = _dicts_to_rows(dicts, fieldnames, restval, extrasaction)
+            _write_rows(csvwriter, rows, f, progress, batch_size)
+        if progress is not None:
+            progress.finish(tell(f))
+    except:
+        discard_fileobject(f)
+        raise
+    finally:
+        f.close()
+    return filename if filename is not None else getattr(f, 'name', None)
+
+def _write_rows(writer, rows, f, progress=None, batch_size=None):
+    """ writes rows to f with writer.writerows, in batches of batch_size
+    (or progress.batch) if either is given, and reports each batch to
+    progress. Silent, unbatched writes are one :meth:`writerows` call."""
+    if progress is None and batch_size is None:
+        writer.writerows(rows)
+        return
+    for batch in _batches(rows, batch_size or progress.batch):
+        writer.writerows(batch)
+        if progress is not None:
+            progress.update(len(batch), tell(f))
+
+def _batches(iterable, batch_size):
+    """ yields lists of up to batch_size items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _dicts_to_rows(dicts, fieldnames, restval='', extrasaction='ignore'):
+    """ yields a list of values (ordered by fieldnames) for each dict"""
+    if extrasaction == 'raise':
+        known = set(fieldnames)
+        for d in dicts:
+            extra = [k for k in d if k not in known]
+            if extra:
+                raise ValueError("dict contains fields not in fieldnames: %r"
+                        % extra)
+            yield [d.get(k, restval) for k in fieldnames]
+    else:
+        for d in dicts:
+            yield [d.get(k, restval) for k in fieldnames]
+
+def _write_spilled(csvwriter, dicts, restval, batch_size, f=None,
+        progress=None):
+    """ pickles batches of rows to a temporary file while discovering the
+    keys of dicts (new keys get new columns at the end), then writes the
+    sorted header to csvwriter followed by the spilled rows, padded and
+    reordered to match. Values are pickled rather than written as csv so
+    they reach csvwriter unchanged (numbers stay numbers for
+    QUOTE_NONNUMERIC, etc.)"""
+    names = []
+    positions = {}
+    spill = tempfile.TemporaryFile()
+    try:
+        for batch in _batches(dicts, batch_size):
+            for d in batch:
+                for k in d:
+                    if k not in positions:
+                        positions[k] = len(names)
+                        names.append(k)
+            pickle.dump([[d.get(k, restval) for k in names] for d in batch],
+                    spill, pickle.HIGHEST_PROTOCOL)
+        fieldnames = sorted(names)
+        csvwriter.writerow(fieldnames)
+        order = [positions[k] for k in fieldnames]
+        width = len(names)
+        spill.seek(0)
+        for batch in _unpickle_batches(spill):
+            for row in batch:
+                if len(row) < width:
+                    row.extend([restval] * (width - len(row)))
+            csvwriter.writerows([row[i] for i in order] for row in batch)
+            if progress is not None:
+                progress.update(len(batch), tell(f))
+    finally:
+        spill.close()
+
+def _unpickle_batches(f):
+    """ yields the objects pickled one after another into f"""
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            return
 
 def convert_list_to_csv(*args, **kwargs):
     """ deprecated, wrapper for write_list"""
@@ -116,6 +310,7 @@ def write_list(
         quotechar = None,
         quoting = None,
         dialect = 'excel',
+        progress = None,
         **kwargs):
     """Takes a list of data (generally list of list) and writes it to a
     file as a csv.
@@ -124,6 +319,7 @@ def write_list(
         (becomes first row of csv)
     :param filename: default is ``pretty_time``, filename can also be a :class:`fileobject`
         (passed through :func:`~simplefile.get_fileobject`)
+    :param progress: progress hook, see :func:`.simpleprogress.get_progress`
 
     All other args passed to :class:`~csv.writer`, args with None are written for convenience
     reminder.
@@ -132,22 +328,23 @@ def write_list(
     if delimiter is not None: kwargs['delimiter'] = delimiter
     if quotechar is not None: kwargs['quotechar'] = quotechar
     if quoting is not None: kwargs['quoting'] = quoting
+    progress = get_progress(progress, 'write_list')
     # get file object
-    f = get_fileobject(filename,mode='wb',ext='.csv')
+    f = get_fileobject(filename,mode='wb',ext='.csv',
+            **pop_file_options(kwargs))
     # write with csvwriter
     try:
         mycsvwriter =  csv.writer(f,**kwargs)
         mycsvwriter.writerow(lst.pop(header_row))
-        print "Writing rows",
-        i = 0
-        for elem in lst:
-            mycsvwriter.writerow(elem)
-            print ".",
-            i += 1
-        print("\nWrote {!d} rows.".format(i))
+        _write_rows(mycsvwriter, lst, f, progress)
+        if progress is not None:
+            progress.finish(tell(f))
+    except:
+        discard_fileobject(f)
+        raise
     finally:
         f.close()
-        return filename
+    return filename
 
 def read_csv_to_list(*args, **kwargs):
     """deprecated, wrapper for read_to_list"""
@@ -159,27 +356,237 @@ def read_to_list(
         delimiter=None,
         quotechar = None,
         encoding = None,
+        progress = None,
         **kwargs):
     """ reads the csv at 'path' and outputs a list with all lines maintained
     (so, the column titles) any keywords for csvreader can be passed
     through if desired)"""
+    return list(iter_lists(path, dialect=dialect, delimiter=delimiter,
+        quotechar=quotechar, encoding=encoding,
+        progress=get_progress(progress, 'read_to_list'), **kwargs))
+
+def iter_lists(
+        path,
+        dialect='excel',
+        delimiter=None,
+        quotechar = None,
+        encoding = None,
+        progress = None,
+        **kwargs):
+    """ generator version of :func:`read_to_list`: yields each line of the
+    csv at 'path' as a list as soon as it is parsed, so memory use does not
+    grow with the size of the file. Takes the same keywords as
+    :func:`read_to_list`; path can be fileobject or system path.
+
+    The file is opened immediately (so a bad path fails here, not on the
+    first ``next()``) and closed once the generator is exhausted, closed or
+    garbage collected."""
     # store defaults
     kwargs['dialect'] = dialect
     if delimiter is not None: kwargs['delimiter'] = delimiter
     if quotechar is not None: kwargs['quotechar'] = quotechar
 
-    f = get_fileobject(path,mode='rb')
+    progress = get_progress(progress, 'iter_lists')
+    f = get_fileobject(path,mode='rb',**pop_file_options(kwargs))
+    mycsvreader = csv.reader(f,**kwargs)
+    if encoding:
+        mycsvreader = ([y.decode(encoding) for y in x] for x in mycsvreader)
+    return _iter_rows(mycsvreader, f, progress)
 
+def _iter_rows(rows, f, progress=None):
+    """ yields everything in rows (reporting to progress, if given, every
+    progress.batch rows) and closes f when done or when the generator is
+    discarded"""
     try:
-        mycsvreader = csv.reader(f,**kwargs)
-        # if an encoding was specified, decodes the characters and return
-        # otherwise just return using list generators
-        if encoding:
-            return [map(lambda y: y.decode(encoding),x) for x in mycsvreader]
-        return [x for x in mycsvreader]
+        if progress is None:
+            for x in rows:
+                yield x
+        else:
+            for batch in _batches(rows, progress.batch):
+                progress.update(len(batch), tell(f))
+                for x in batch:
+                    yield x
+            progress.finish(tell(f))
     finally:
         f.close()
 
+def read_typed(path, schema=None, as_dicts=False, **kwargs):
+    """ reads the csv at 'path' like :func:`read_to_list` (or
+    :func:`read_to_dict` if as_dicts), but with values converted to Python
+    types. See :func:`iter_typed` for keywords."""
+    return list(iter_typed(path, schema=schema, as_dicts=as_dicts, **kwargs))
+
+def iter_typed(
+        path,
+        schema=None,
+        header=True,
+        as_dicts=False,
+        sample_size=1000,
+        errors=None,
+        nulls=('',),
+        encoding=None,
+        progress=None,
+        **kwargs):
+    """ yields the rows of the csv at 'path' with each value converted to a
+    Python type (int, float, bool, date, str or None, see
+    :mod:`~.simpletypes`).
+
+    :param schema: one type per column (or a mapping of column title ->
+        type). If None, the schema is inferred from the first ``sample_size``
+        rows after the header.
+    :param header: True if the first line holds column titles (yielded
+        first, as in :func:`read_to_list`, unless as_dicts)
+    :param as_dicts: yield dicts keyed by column title instead of lists
+    :param errors: a list to which a :class:`~.simpletypes.ConversionError`
+        (row, column, name, value, error) is appended for every value that
+        can't be converted; such values become None and reading goes on
+    :param nulls: values that nullable ('int?' etc.) columns read as None
+    :param encoding: text columns are decoded with it. Numeric, bool and date
+        columns are converted straight from the bytes, so only text cells
+        are ever decoded, once, inside the compiled converters.
+
+    Other keywords (dialect, delimiter, ...) are passed to :func:`iter_lists`.
+    """
+    rows = iter_lists(path, progress=progress, **kwargs)
+    fieldnames = None
+    if header or as_dicts:
+        fieldnames = next(rows, [])
+        if encoding:
+            fieldnames = [y.decode(encoding) for y in fieldnames]
+    if schema is None:
+        sample = list(islice(rows, sample_size))
+        schema = simpletypes.infer_schema(sample, nulls)
+        rows = chain(sample, rows)
+    plan = simpletypes.compile_converters(schema, fieldnames, encoding, nulls)
+    rows = simpletypes.convert_rows(rows, plan, errors, fieldnames,
+            start=1 if fieldnames is not None else 0)
+    if as_dicts:
+        return (dict(izip(fieldnames, row)) for row in rows)
+    if fieldnames is not None:
+        return chain([fieldnames], rows)
+    return rows
+
+def read_columns(
+        path,
+        usecols=None,
+        schema=None,
+        use_numpy=None,
+        sample_size=1000,
+        batch_size=10000,
+        errors=None,
+        nulls=('',),
+        encoding=None,
+        progress=None,
+        **kwargs):
+    """ loads the csv at 'path' (first line = column titles) column by
+    column and returns an :class:`~collections.OrderedDict` of column title
+    -> column, in file order.
+
+    Columns are stored compactly according to their type (inferred from the
+    first ``sample_size`` rows unless a schema is given, see
+    :func:`iter_typed`):
+
+    * int/float - :class:`array.array` ('l'/'d'), or a NumPy array if NumPy is
+      installed (and use_numpy isn't False). Nullable floats hold NaN for
+      nulls, nullable ints become floats with NumPy and lists without.
+    * everything else - lists, with equal strings stored only once
+
+    :param usecols: column titles (or indexes) to load; other columns are
+        never converted or stored
+    :param schema: sequence of types for the selected columns, or a mapping
+        of column title -> type
+    :param batch_size: number of rows converted per batch
+
+    errors, nulls, encoding and the remaining keywords are as for
+    :func:`iter_typed`.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("use_numpy=True requires numpy, please install it!")
+    rows = iter_lists(path, progress=progress, **kwargs)
+    fieldnames = next(rows, [])
+    if encoding:
+        fieldnames = [y.decode(encoding) for y in fieldnames]
+    if usecols is None:
+        indices = range(len(fieldnames))
+    else:
+        indices = [col if isinstance(col, (int, long)) else fieldnames.index(col)
+                   for col in usecols]
+        indices.sort()
+    names = [fieldnames[i] for i in indices]
+    width = max(indices) + 1 if indices else 0
+    select = _selector(indices)
+    def selected(rows):
+        for row in rows:
+            if not row:
+                # blank line, left out of the columns below
+                yield row
+                continue
+            if len(row) < width:
+                row.extend([nulls[0]] * (width - len(row)))
+            yield list(select(row))
+    rows = selected(rows)
+    if schema is None:
+        sample = list(islice(rows, sample_size))
+        if sample:
+            schema = simpletypes.infer_schema(sample, nulls)
+        else:
+            # nothing but the header, as for columns of nulls
+            schema = ['str?'] * len(names)
+        rows = chain(sample, rows)
+    elif hasattr(schema, 'keys'):
+        schema = [schema.get(name, 'str') for name in names]
+    if len(schema) != len(names):
+        raise ValueError("schema has %d types for %d columns" % (len(schema),
+            len(names)))
+    plan = simpletypes.compile_converters(schema, names, encoding, nulls)
+    rows = simpletypes.convert_rows(rows, plan, errors, names, start=1)
+    rows = (row for row in rows if row)
+    columns = [_Column(spec) for spec in schema]
+    for batch in _batches(rows, batch_size):
+        for column, values in izip(columns, izip(*batch)):
+            column.extend(values)
+    return OrderedDict((name, column.finish(use_numpy))
+                       for name, column in izip(names, columns))
+
+class _Column(object):
+    """ accumulates the values of one column of :func:`read_columns`: in an
+    array.array for int/float (while they fit), in a list otherwise, with
+    equal strings stored only once"""
+    def __init__(self, spec):
+        self.spec = spec
+        self.cache = {}
+        if spec in ('int', 'float', 'float?'):
+            self.values = array('l' if spec == 'int' else 'd')
+        else:
+            self.values = []
+
+    def extend(self, values):
+        if isinstance(self.values, array):
+            if self.spec == 'float?':
+                nan = float('nan')
+                values = [nan if v is None else v for v in values]
+            try:
+                self.values.extend(array(self.values.typecode, values))
+                return
+            except (TypeError, OverflowError):
+                # a failed conversion (None) or an int too big for a C long:
+                # give up on compact storage for this column
+                self.values = self.values.tolist()
+        setdefault = self.cache.setdefault
+        self.values.extend([setdefault(v, v) if isinstance(v, basestring)
+                            else v for v in values])
+
+    def finish(self, use_numpy):
+        """ :returns: the column, as a NumPy array if use_numpy and numeric"""
+        if use_numpy:
+            if isinstance(self.values, array):
+                return numpy.frombuffer(self.values, dtype=self.values.typecode)
+            if self.spec.rstrip('?') in ('int', 'float'):
+                return numpy.array([numpy.nan if v is None else v
+                                    for v in self.values])
+        return self.values
 
 def read_csv_to_dict(*args, **kwargs):
     """deprecated, wrapper for read_to_dict"""
@@ -190,19 +597,517 @@ def read_to_dict(
         delimiter=None,
         quotechar=None,
         encoding = None,
+        progress = None,
+        usecols = None,
+        where = None,
         **kwargs):
     """ reads the csv at 'path' and outputs a dict with keywords from the
     firstline (so, the column titles) any keywords for csvreader can be passed
     through if desired).
     path can be fileobject or system path
-    Keywords are listed for convenience, only non-None are kept"""
+    Keywords are listed for convenience, only non-None are kept
+
+    :param usecols: column titles to keep; other columns never make it into
+        a dict
+    :param where: rows to keep, checked against the raw fields before any
+        dict is built. Either a function taking the list of fields (in file
+        order) and returning True to keep the row, or a ``(column, op,
+        value)`` spec (or a list of them, all of which must match) with op
+        one of ``== != < <= > >= in`` or ``not in``. Fields are compared as
+        strings, or as floats if value is a number (rows that don't convert
+        don't match).
+    """
+    return list(iter_dicts(path, dialect=dialect, delimiter=delimiter,
+        quotechar=quotechar, encoding=encoding,
+        progress=get_progress(progress, 'read_to_dict'), usecols=usecols,
+        where=where, **kwargs))
+
+def iter_dicts(
+        path,
+        dialect='excel',
+        delimiter=None,
+        quotechar=None,
+        encoding = None,
+        progress = None,
+        usecols = None,
+        where = None,
+        **kwargs):
+    """ generator version of :func:`read_to_dict`: yields one dict per line
+    (keyed by the column titles) as soon as it is parsed. Takes the same
+    keywords as :func:`read_to_dict`; the file is closed once the generator
+    is exhausted, closed or garbage collected."""
     kwargs['dialect'] = dialect
     if not delimiter is None: kwargs['delimiter'] = delimiter
     if not quotechar is None: kwargs['quotechar'] = quotechar
-    f = get_fileobject(path,mode='rb')
+    progress = get_progress(progress, 'iter_dicts')
+    f = get_fileobject(path,mode='rb',**pop_file_options(kwargs))
+    if usecols is not None or where is not None:
+        fieldnames = kwargs.pop('fieldnames', None)
+        restval = kwargs.pop('restval', None)
+        kwargs.pop('restkey', None)
+        mycsvreader = _filtered_dicts(csv.reader(f, **kwargs), fieldnames,
+                usecols, where, restval, encoding)
+        return _iter_rows(mycsvreader, f, progress)
+    mycsvreader = csv.DictReader(f,**kwargs)
+    if encoding:
+        mycsvreader = (dict((_decode_value(k, encoding),
+                             _decode_value(v, encoding))
+                            for k, v in x.iteritems())
+                       for x in mycsvreader)
+    return _iter_rows(mycsvreader, f, progress)
+
+def _selector(indices):
+    """ :returns: function that picks the fields at indices out of a row"""
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+# operators for where specs
+_WHERE_OPS = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'in': lambda field, value: field in value,
+        'not in': lambda field, value: field not in value,
+        }
+
+def _compile_where(where, fieldnames):
+    """ turns a where spec (see :func:`read_to_dict`) into a function that
+    takes a raw row (list of strings) and returns True to keep it"""
+    if where is None or callable(where):
+        return where
+    if (len(where) == 3 and isinstance(where[1], basestring)
+            and where[1] in _WHERE_OPS):
+        where = [where]
+    tests = []
+    for column, op, value in where:
+        if op not in _WHERE_OPS:
+            raise ValueError("unknown operator %r in where, expected one of %r"
+                    % (op, sorted(_WHERE_OPS)))
+        index = fieldnames.index(column)
+        sample = value
+        if op in ('in', 'not in'):
+            value = list(value)
+            sample = value[0] if value else None
+        numeric = (isinstance(sample, (int, long, float))
+                   and not isinstance(sample, bool))
+        if numeric and op in ('in', 'not in'):
+            value = [float(v) for v in value]
+        tests.append((index, _WHERE_OPS[op], value, numeric))
+    def test(row):
+        for index, op, value, numeric in tests:
+            field = row[index]
+            if numeric:
+                try:
+                    field = float(field)
+                except (TypeError, ValueError):
+                    # not a number, or missing from a short row
+                    return False
+            if not op(field, value):
+                return False
+        return True
+    return test
+
+def _filtered_dicts(mycsvreader, fieldnames, usecols, where, restval=None,
+        encoding=None):
+    """ yields dicts for the rows of a csv.reader, like csv.DictReader,
+    but checks where against the raw fields and keeps only usecols
+    before building each dict"""
+    if fieldnames is None:
+        fieldnames = next(mycsvreader, None)
+        if fieldnames is None:
+            return
+    fieldnames = list(fieldnames)
+    if usecols is None:
+        indices = range(len(fieldnames))
+    else:
+        indices = [fieldnames.index(col) for col in usecols]
+    keys = [fieldnames[i] for i in indices]
+    if encoding:
+        keys = [k.decode(encoding) for k in keys]
+    select = _selector(indices)
+    test = _compile_where(where, fieldnames)
+    width = len(fieldnames)
+    for row in mycsvreader:
+        if not row:
+            # blank lines are skipped, as by DictReader
+            continue
+        if len(row) < width:
+            row.extend([restval] * (width - len(row)))
+        if test is not None and not test(row):
+            continue
+        values = select(row)
+        if encoding:
+            values = [_decode_value(v, encoding) for v in values]
+        yield dict(izip(keys, values))
+
+def _decode_value(value, encoding):
+    """ decodes a DictReader value (str, list of extra fields or None)"""
+    if isinstance(value, str):
+        return value.decode(encoding)
+    if isinstance(value, list):
+        return [_decode_value(y, encoding) for y in value]
+    return value
+
+
+def read_to_list_parallel(path, processes=None, chunk_size=None, **kwargs):
+    """ like :func:`read_to_list`, but splits the file at 'path' into chunks
+    that are parsed by a :class:`multiprocessing.Pool`. Rows are returned in
+    their original order. Takes the same keywords as :func:`read_to_list`;
+    see :func:`iter_lists_parallel` for the rest."""
+    return list(iter_lists_parallel(path, processes=processes,
+        chunk_size=chunk_size, ordered=True, **kwargs))
+
+def iter_lists_parallel(
+        path,
+        processes=None,
+        chunk_size=None,
+        ordered=True,
+        dialect='excel',
+        delimiter=None,
+        quotechar=None,
+        encoding=None,
+        progress=None,
+        **kwargs):
+    """ parses the csv at 'path' in parallel and yields its rows (as lists,
+    like :func:`iter_lists`) chunk by chunk as the pool finishes them.
+
+    The file is split into byte ranges of about ``chunk_size`` bytes (default:
+    enough for four chunks per process, at least 1MB). Split points are
+    moved forward to the next line ending that is outside a quoted field, so
+    quoted fields containing newlines are never cut in half (this relies on
+    quotes being doubled, as in the standard dialects: with an
+    ``escapechar`` the file is read as a single chunk).
+
+    :param path: path to a file on disk (workers reopen it, so fileobjects
+        can't be used)
+    :param processes: size of the pool, default :func:`multiprocessing.cpu_count`
+    :param ordered: if False, chunks are yielded as soon as any worker
+        finishes, so rows come out grouped by chunk but in no particular order
+    :param progress: progress hook, see :func:`.simpleprogress.get_progress`
+
+    With a single process, or a file that makes a single chunk, a pool
+    would only add the cost of sending every row back, so the file is read
+    with :func:`iter_lists` instead (and progress is reported under its
+    name).
+
+    Other keywords are as for :func:`read_to_list`.
+    """
+    if not isinstance(path, basestring):
+        raise TypeError("parallel reads need a path, not %r" % type(path))
+    if detect_compression(path):
+        raise ValueError("compressed files can't be split, use iter_lists")
+    kwargs['dialect'] = dialect
+    if delimiter is not None: kwargs['delimiter'] = delimiter
+    if quotechar is not None: kwargs['quotechar'] = quotechar
+    processes = processes or multiprocessing.cpu_count()
+    size = os.path.getsize(path)
+    if chunk_size is None:
+        chunk_size = max(1 << 20, size // (processes * 4) + 1)
+    with open(path, 'rb') as f:
+        bounds = _chunk_boundaries(f, chunk_size, _boundary_quotechar(kwargs))
+    tasks = [(path, start, end, kwargs, encoding)
+             for start, end in zip(bounds, bounds[1:])]
+    if processes <= 1 or len(tasks) <= 1:
+        return iter_lists(path, encoding=encoding, progress=progress,
+                **kwargs)
+    progress = get_progress(progress, 'iter_lists_parallel')
+    return _iter_parallel(tasks, processes, ordered, progress)
+
+def _iter_parallel(tasks, processes, ordered, progress=None):
+    """ runs _parse_chunk over tasks in a pool and yields the rows"""
+    pool = multiprocessing.Pool(processes)
     try:
-        mycsvreader = csv.DictReader(f,**kwargs)
-        return [x for x in mycsvreader]
+        if ordered:
+            results = pool.imap(_parse_chunk, tasks)
+        else:
+            results = pool.imap_unordered(_parse_chunk, tasks)
+        nbytes = 0
+        for nread, rows in results:
+            if progress is not None:
+                nbytes += nread
+                progress.update(len(rows), nbytes)
+            for row in rows:
+                yield row
+        pool.close()
+        if progress is not None:
+            progress.finish()
     finally:
-        f.close()
+        # terminate is a no-op for a closed pool whose work is done, and
+        # stops the workers if the generator is abandoned early
+        pool.terminate()
+        pool.join()
+
+def _parse_chunk(task):
+    """ pool worker: parses bytes [start, end) of path, returns
+    (number of bytes read, list of rows)"""
+    path, start, end, kwargs, encoding = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = csv.reader(io.BytesIO(data), **kwargs)
+    if encoding:
+        return len(data), [[y.decode(encoding) for y in x] for x in rows]
+    return len(data), list(rows)
+
+def _boundary_quotechar(kwargs):
+    """ for csv reader keywords, returns the character that starts/ends
+    quoted fields, '' if quotes are not special (QUOTE_NONE) or None if
+    record boundaries can't be found by counting quotes (escapechar set)"""
+    dialect = kwargs.get('dialect', 'excel')
+    if isinstance(dialect, basestring):
+        dialect = csv.get_dialect(dialect)
+    quoting = kwargs.get('quoting', getattr(dialect, 'quoting', csv.QUOTE_MINIMAL))
+    if kwargs.get('escapechar', getattr(dialect, 'escapechar', None)):
+        return None
+    if quoting == csv.QUOTE_NONE:
+        return ''
+    return kwargs.get('quotechar', getattr(dialect, 'quotechar', '"'))
+
+def _chunk_boundaries(f, chunk_size, quotechar='"', blocksize=1 << 20):
+    """ returns sorted byte offsets (starting with 0 and ending with the
+    file size) that split file f into chunks of roughly chunk_size bytes,
+    each starting at the beginning of a record.
+
+    Reads f once in blocks and tracks whether each offset is inside a quoted
+    field by the parity of the number of quote characters before it (doubled
+    quotes cancel out). If quotechar is None, the whole file is one chunk."""
+    f.seek(0)
+    bounds = [0]
+    if quotechar is None:
+        f.seek(0, 2)
+        end = f.tell()
+        return bounds + [end] if end else bounds
+    if quotechar:
+        count = lambda block, i, j: block.count(quotechar, i, j) & 1
+    else:
+        count = lambda block, i, j: 0
+    pos = 0           # file offset of the current block
+    quoted = 0        # 1 if pos + i is inside a quoted field
+    next_split = chunk_size
+    while True:
+        block = f.read(blocksize)
+        if not block:
+            break
+        n = len(block)
+        i = 0
+        while pos + n > next_split:
+            # skip to the split point, then find the next unquoted newline
+            j = max(next_split - pos, i)
+            quoted ^= count(block, i, j)
+            nl = block.find('\n', j)
+            if nl == -1:
+                quoted ^= count(block, j, n)
+                i = n
+                break
+            quoted ^= count(block, j, nl)
+            i = nl + 1
+            if not quoted:
+                bounds.append(pos + i)
+                next_split = pos + i + chunk_size
+        else:
+            quoted ^= count(block, i, n)
+        pos += n
+    if pos > bounds[-1]:
+        bounds.append(pos)
+    return bounds
+
+
+# array typecode for row offsets: unsigned 64-bit ('Q' needs Python 3.3+)
+try:
+    array('Q')
+    _OFFSET_TYPECODE = 'Q'
+except ValueError:
+    _OFFSET_TYPECODE = 'L'
+
+try:
+    # python 2: buffer slices an mmap without copying
+    _view = buffer
+except NameError:
+    # python 3
+    def _view(obj, offset, size):
+        return memoryview(obj)[offset:offset + size]
+
+def _record_offsets(f, quotechar='"', blocksize=1 << 20):
+    """ scans file f once and returns an array of the byte offsets at which
+    each record starts, followed by the file size. Newlines inside quoted
+    fields are skipped (see :func:`_chunk_boundaries`)."""
+    offsets = array(_OFFSET_TYPECODE, [0])
+    append = offsets.append
+    f.seek(0)
+    pos = 0
+    quoted = 0
+    while True:
+        block = f.read(blocksize)
+        if not block:
+            break
+        n = len(block)
+        i = 0
+        find = block.find
+        if quoted or (quotechar and quotechar in block):
+            count = block.count
+            while True:
+                nl = find('\n', i)
+                if nl == -1:
+                    quoted ^= count(quotechar, i, n) & 1
+                    break
+                quoted ^= count(quotechar, i, nl) & 1
+                i = nl + 1
+                if not quoted:
+                    append(pos + i)
+        else:
+            # no quotes in sight, every newline ends a record
+            nl = find('\n')
+            while nl != -1:
+                append(pos + nl + 1)
+                nl = find('\n', nl + 1)
+        pos += n
+    if pos > offsets[-1]:
+        # last record has no line ending
+        append(pos)
+    return offsets
+
+class MappedCSV(object):
+    """ memory-mapped, random-access view of the rows of a csv file.
+
+    One scan of the file builds an index of the byte offset of each record
+    (an :class:`array.array` of 64-bit offsets), which is saved next to the
+    file (``path + '.idx'``) and reused for as long as the file's size and
+    mtime don't change. After that::
+
+        rows = MappedCSV('big.csv')
+        len(rows)            # number of rows, header included
+        rows[5000000]        # parses just that row
+        rows[10:20]          # parses just those rows, as a list
+        rows.raw(10, 20)     # their unparsed bytes, without copying
+
+    Rows are lists, as in :func:`read_to_list`, and the dialect keywords are
+    the same. Quoted fields may contain newlines as long as quotes are
+    doubled (``escapechar`` is not supported).
+
+    :param index_path: where to store the index, ``False`` to never save it
+    """
+    _MAGIC = 'SUCSVIX1'
+    _HEADER = struct.Struct('<8sQdBc')
+
+    def __init__(
+            self,
+            path,
+            dialect='excel',
+            delimiter=None,
+            quotechar=None,
+            encoding=None,
+            index_path=None,
+            **kwargs):
+        kwargs['dialect'] = dialect
+        if delimiter is not None: kwargs['delimiter'] = delimiter
+        if quotechar is not None: kwargs['quotechar'] = quotechar
+        self._quotechar = _boundary_quotechar(kwargs)
+        if self._quotechar is None:
+            raise ValueError("MappedCSV can't index files with an escapechar")
+        if detect_compression(path):
+            raise ValueError("MappedCSV can't map compressed files")
+        self.kwargs = kwargs
+        self.encoding = encoding
+        self.path = path
+        self.index_path = path + '.idx' if index_path is None else index_path
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._stamp = (stat.st_size, stat.st_mtime)
+        if stat.st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        else:
+            # can't map an empty file
+            self._map = ''
+        self.offsets = self._load_index()
+        if self.offsets is None:
+            self.offsets = _record_offsets(self._file, self._quotechar)
+            self._save_index()
+
+    def _header(self):
+        size, mtime = self._stamp
+        return self._HEADER.pack(self._MAGIC, size, mtime,
+                array(_OFFSET_TYPECODE).itemsize, self._quotechar or '\0')
+
+    def _load_index(self):
+        """ :returns: offsets from index_path, or None if missing or stale"""
+        if not self.index_path:
+            return None
+        try:
+            with open(self.index_path, 'rb') as f:
+                if f.read(self._HEADER.size) != self._header():
+                    return None
+                offsets = array(_OFFSET_TYPECODE)
+                offsets.fromstring(f.read())
+        except (IOError, OSError):
+            return None
+        return offsets
+
+    def _save_index(self):
+        """ writes the index next to the file (best effort, an unwritable
+        directory just means the index is rebuilt next time)"""
+        if not self.index_path:
+            return
+        tmp = '%s.%d.tmp' % (self.index_path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(self._header())
+                f.write(self.offsets.tostring())
+            os.rename(tmp, self.index_path)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, start, stop=None):
+        """ :returns: a zero-copy buffer/memoryview of the bytes of rows
+        start to stop (just row start if stop is None), line endings
+        included"""
+        if stop is None:
+            stop = start + 1
+        start = self.offsets[start]
+        return _view(self._map, start, self.offsets[stop] - start)
+
+    def _parse(self, start, stop):
+        rows = csv.reader(io.BytesIO(self.raw(start, stop)), **self.kwargs)
+        if self.encoding:
+            encoding = self.encoding
+            return [[y.decode(encoding) for y in x] for x in rows]
+        return list(rows)
+
+    def __getitem__(self, key):
+        n = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n)
+            if step != 1:
+                return [self[i] for i in xrange(start, stop, step)]
+            if start >= stop:
+                return []
+            return self._parse(start, stop)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("row index out of range")
+        return (self._parse(key, key + 1) or [[]])[0]
+
+    def __iter__(self):
+        return iter_lists(io.BytesIO(self.raw(0, len(self))),
+                encoding=self.encoding, **self.kwargs)
+
+    def close(self):
+        if not isinstance(self._map, str):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc_info):
+        self.close()
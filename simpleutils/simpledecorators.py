@@ -8,10 +8,48 @@ contains:
         TODO: test catch_exceptions' handler
     -dump_args - decorator to print function arguments (taken from the Python
     decorator library)
+    -memo - caching decorator, optionally bounded (LRU) and with expiry
+    -persistent_memo - memo that keeps results in an sqlite file, shared by
+        processes and across runs
+
+memo and catch_exceptions also wrap coroutine functions (``async def``,
+when asyncio is available): see their docs.
 
 There are some great, more advanced libraries for decorators out there.
 This is not one of them. This aims to be simple, quick and easy to use.
 """
+from __future__ import print_function
+
+import atexit
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import namedtuple
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    import sqlite3
+except ImportError:
+    # python built without sqlite
+    sqlite3 = None
+try:
+    import asyncio
+except ImportError:
+    # python 2
+    asyncio = None
+
+from .simpledict import boundeddefaultfunctiondict
+
+def _update_metadata(g, f):
+    """ gives wrapper g the name, doc string, module and dict of f"""
+    g.__name__ = f.__name__
+    g.__doc__ = f.__doc__
+    g.__module__ = f.__module__
+    g.__dict__.update(f.__dict__)
 
 def simple_decorator(decorator):
     """Converts simple functions into well-behaved decorators. (meaning
@@ -37,12 +75,9 @@ def simple_decorator(decorator):
     def new_decorator(f,*args,**kwargs):
         try:
             g = decorator(f,*args,**kwargs)
-            g.__name__ = f.__name__
-            g.__doc__ = f.__doc__
-            g.__module__ = f.__module__
-            g.__dict__.update(f.__dict__)
+            _update_metadata(g, f)
         except AttributeError as e:
-            if 'NoneType' in e.message:
+            if 'NoneType' in str(e):
                 raise ValueError("simple_decorator: decorator must return a function.")
             else:
                 raise
@@ -59,6 +94,60 @@ def _pass(*args,**kwargs):
     """ lambda function to do nothing with ternary """
     pass
 
+def _is_coroutine_function(f):
+    return asyncio is not None and asyncio.iscoroutinefunction(f)
+
+def _mark_coroutine_function(f):
+    """ makes asyncio.iscoroutinefunction(f) true for a plain function that
+    returns an awaitable, so decorators stacked on top (e.g. :func:`memo`)
+    treat it as a coroutine function"""
+    # inspect.markcoroutinefunction is python 3.12+; older versions (and
+    # asyncio.iscoroutinefunction up to 3.13) look for this marker
+    mark = getattr(inspect, 'markcoroutinefunction', None)
+    if mark is not None:
+        mark(f)
+    marker = getattr(asyncio.coroutines, '_is_coroutine', None)
+    if marker is not None:
+        f._is_coroutine = marker
+    return f
+
+def _get_loop(future):
+    # Future.get_loop is python 3.7+
+    get_loop = getattr(future, 'get_loop', None)
+    return get_loop() if get_loop is not None else future._loop
+
+def _catch_async(f, args, kwargs, exceptions, handler_func,
+        valid_exceptions):
+    """ runs coroutine function f as a task, returning a future of its result
+    or of handler_func's (for the given exceptions)"""
+    task = asyncio.ensure_future(f(*args, **kwargs))
+    outer = _get_loop(task).create_future()
+    def done(task):
+        if outer.done():
+            return
+        if task.cancelled():
+            outer.cancel()
+            return
+        e = task.exception()
+        if e is None:
+            outer.set_result(task.result())
+        elif isinstance(e, exceptions):
+            try:
+                outer.set_result(handler_func(exception=e, function=f,
+                    args=args, kwargs=kwargs))
+            except Exception as handler_error:
+                outer.set_exception(handler_error)
+        else:
+            print("Uncaught exception in function %s, not %s" % (
+                    f.__name__, valid_exceptions))
+            outer.set_exception(e)
+    def cancelled(outer):
+        if outer.cancelled():
+            task.cancel()
+    task.add_done_callback(done)
+    outer.add_done_callback(cancelled)
+    return outer
+
 @simple_decorator
 def catch_exceptions(*exceptions, **kwargs):
     """catches exceptions. (decorator factory)
@@ -72,24 +161,34 @@ def catch_exceptions(*exceptions, **kwargs):
                 'exception' : the exception instance
                 'function' : the function given decorated
                 'args' : positional arguments
-                'kwargs' : keyword arguments"""
+                'kwargs' : keyword arguments
+
+    For a coroutine function, calls return an :class:`asyncio.Future` of
+    the coroutine's result (or of handler_func's, if it raised one of the
+    exceptions). The wrapper counts as a coroutine function, so it can be
+    decorated with :func:`memo` in turn."""
     # function design inspired by a variety of online resources,
     # particularly nose's @raises test decorator. nose is a great test
     # suite, check it out!
-    print exceptions, kwargs
+    print(exceptions, kwargs)
     valid_exceptions = ' or '.join([x.__name__ for x in exceptions])
     HANDLER= 'handler_func'
-    handler_func = kwargs[HANDLER] if kwargs.has_key(HANDLER) else _pass
+    handler_func = kwargs[HANDLER] if HANDLER in kwargs else _pass
     def ce_wrapper(f):
         name = f.__name__
+        if _is_coroutine_function(f):
+            def catch_coroutine(*args,**kwargs):
+                return _catch_async(f, args, kwargs, exceptions,
+                        handler_func, valid_exceptions)
+            return _mark_coroutine_function(catch_coroutine)
         def catch_function(*args,**kwargs):
             try:
                 return f(*args,**kwargs)
             except exceptions as e:
                 return handler_func(exception=e,function=f,args=args,kwargs=kwargs)
             except:
-                print "Uncaught exception in function %s, not %s" % (
-                        name,valid_exceptions)
+                print("Uncaught exception in function %s, not %s" % (
+                        name,valid_exceptions))
                 raise
         return catch_function
     return ce_wrapper
@@ -103,32 +202,458 @@ def dump_args(func):
 
     # using list here instead of original tuple because allows splicing of list
     # into parts to display positional arg names as well as *args input
-    argnames = list(func.func_code.co_varnames[:func.func_code.co_argcount])
-    fname = func.func_name
+    argnames = list(func.__code__.co_varnames[:func.__code__.co_argcount])
+    fname = func.__name__
 
     def echo_func(*args,**kwargs):
         arglist = list(args)
-        print fname, ":", ', '.join(
+        print(fname, ":", ', '.join(
             '%s=%r' % entry
             for entry in (
-                zip(argnames,arglist[0:len(argnames)]) #named positional arguments
+                list(zip(argnames,arglist[0:len(argnames)])) #named positional arguments
                 + [('*args',arglist[len(argnames):])] # args passed through *args
-                + kwargs.items())) #kwargs (form is (kw,val)
+                + list(kwargs.items())))) #kwargs (form is (kw,val)
         return func(*args, **kwargs)
 
     return echo_func
 
-@simple_decorator
-def memo(f):
-    """Decorator that caches return value for each fxn call and looks it up next time"""
-    cache = {}
-    def _f(*args):
+# statistics returned by a memoized function's cache_info() (same fields as
+# functools.lru_cache)
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+# separates positional args from sorted kwargs in memo keys
+_KWARGS_MARK = object()
+
+def make_key(args, kwargs):
+    """ default memo key: args, plus sorted kwargs if there are any (so
+    f(1, b=2) and f(1, b=2.0) share a key, but f(1) and f(a=1) don't)"""
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+def memo(f=None, maxsize=None, ttl=None, key=make_key, timer=time.time):
+    """Decorator that caches return value for each fxn call and looks it up next time
+
+    Works bare (``@memo``, unbounded, as before) or with options
+    (``@memo(maxsize=1000, ttl=60)``).
+
+    :param maxsize: keep at most this many results, evicting the least
+        recently used (default: no limit)
+    :param ttl: results expire this many seconds after they were computed
+    :param key: function (args, kwargs) -> hashable cache key, see
+        :func:`make_key`. Replace it to cache calls with unhashable
+        arguments (e.g. by converting lists to tuples); calls whose key
+        isn't hashable are run uncached (and count as misses).
+    :param timer: clock used for ttl
+
+    The cache is thread-safe (the function itself runs outside the lock, so
+    two threads missing the same key may both call it). The decorated
+    function gets ``cache_info()`` (a :class:`CacheInfo` of hits, misses,
+    maxsize and currsize) and ``cache_clear()``.
+
+    A coroutine function is memoized by caching its task: calls return an
+    awaitable of it, so concurrent awaiters of a key share one run instead
+    of starting one each. Tasks that fail or are cancelled are dropped from
+    the cache; cancelling one awaiter doesn't cancel the others. The cached
+    tasks belong to the event loop they were started on.
+    """
+    if f is None:
+        return lambda f: memo(f, maxsize, ttl, key, timer)
+    if not callable(f):
+        raise TypeError("memo options must be given by keyword, e.g. "
+                "@memo(maxsize=%r), not @memo(%r)" % (f, f))
+    if maxsize is None and ttl is None and not _is_coroutine_function(f):
+        # hits, misses
+        stats = [0, 0]
+        cache = {}
+        _f = _memo_unbounded(f, cache, stats, key)
+        def cache_info():
+            return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+        def cache_clear():
+            cache.clear()
+            stats[:] = [0, 0]
+        _update_metadata(_f, f)
+        _f.cache_info = cache_info
+        _f.cache_clear = cache_clear
+        return _f
+    cache = boundeddefaultfunctiondict(maxsize=maxsize, ttl=ttl, timer=timer)
+    lock = threading.Lock()
+    if _is_coroutine_function(f):
+        _f = _memo_coroutine(f, cache, lock, key)
+    else:
+        _f = _memo_function(f, cache, lock, key)
+    def cache_info():
+        with lock:
+            return CacheInfo(cache.hits, cache.misses, maxsize, len(cache))
+    def cache_clear():
+        with lock:
+            cache.clear()
+            cache.reset_stats()
+    _update_metadata(_f, f)
+    _f.cache_info = cache_info
+    _f.cache_clear = cache_clear
+    return _f
+
+def _memo_unbounded(f, cache, stats, key):
+    """ memo without maxsize or ttl: a plain dict, used without a lock
+    (single dict reads and writes are atomic under the GIL; the counts in
+    stats may miss a few concurrent calls)"""
+    def _f(*args, **kwargs):
         try:
-            cached = cache[args]
-            return cached
+            k = key(args, kwargs)
+            result = cache[k]
         except KeyError:
-            cache[args] = result = f(*args)
+            stats[1] += 1
+        except TypeError:
+            # unhashable arguments, can't be cached
+            stats[1] += 1
+            return f(*args, **kwargs)
+        else:
+            stats[0] += 1
             return result
+        result = f(*args, **kwargs)
+        cache[k] = result
+        return result
+    return _f
+
+def _memo_function(f, cache, lock, key):
+    def _f(*args, **kwargs):
+        try:
+            k = key(args, kwargs)
+            with lock:
+                return cache[k]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable arguments, can't be cached
+            with lock:
+                cache.misses += 1
+            return f(*args, **kwargs)
+        result = f(*args, **kwargs)
+        with lock:
+            cache[k] = result
+        return result
+    return _f
+
+def _memo_coroutine(f, cache, lock, key):
+    """ memo for a coroutine function: the cache holds one task per key, so
+    concurrent callers share it"""
+    def _f(*args, **kwargs):
+        try:
+            k = key(args, kwargs)
+            hash(k)
         except TypeError:
-            return f(args)
+            with lock:
+                cache.misses += 1
+            return f(*args, **kwargs)
+        with lock:
+            try:
+                task = cache[k]
+            except KeyError:
+                task = cache[k] = asyncio.ensure_future(f(*args, **kwargs))
+                task.add_done_callback(lambda task: _forget_failed(cache,
+                    lock, k, task))
+        # a caller that is cancelled doesn't cancel the shared task
+        return asyncio.shield(task)
+    return _mark_coroutine_function(_f)
+
+def _forget_failed(cache, lock, k, task):
+    """ drops a failed or cancelled task from a memo cache so the next call
+    tries again"""
+    if task.cancelled() or task.exception() is not None:
+        with lock:
+            if cache.get(k) is task:
+                del cache[k]
+
+def default_memo_path():
+    """ sqlite file used by :func:`persistent_memo` when none is given:
+    simpleutils-memo.sqlite in $XDG_CACHE_HOME (default ~/.cache)"""
+    directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'), '.cache')
+    return os.path.join(directory, 'simpleutils-memo.sqlite')
+
+def function_version(f):
+    """ :returns: a hash of f's code (bytecode, constants and names), which
+    changes when the function body does, and is the same in every process
+    running the same code"""
+    code = getattr(f, '__code__', None)
+    if code is None:
+        return None
+    digest = hashlib.sha1()
+    _hash_code(digest, code)
+    return digest.hexdigest()
+
+def _hash_code(digest, code):
+    # nested code objects (lambdas, inner functions, generator expressions)
+    # are hashed by content: their repr holds a memory address
+    digest.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _hash_code(digest, const)
+        elif isinstance(const, frozenset):
+            # iteration order of a set of strings changes with the hash seed
+            digest.update(repr(sorted(const, key=repr)).encode('utf-8'))
+        else:
+            digest.update(repr(const).encode('utf-8'))
+        digest.update(b'\0')
+    for part in (code.co_names, code.co_varnames):
+        digest.update(repr(part).encode('utf-8'))
+
+class _MemoStore(object):
+    """ the sqlite table behind :func:`persistent_memo`. Each thread (and
+    process, after a fork) gets its own connection.
+
+    The number and total size of the entries are kept in a one-row table,
+    updated in the same transaction as the entries, so inserts don't have
+    to count the table. Writes take the database's write lock up front
+    (BEGIN IMMEDIATE), so what they read can't change before they commit.
+
+    Access times (for LRU eviction) are only recorded when they are older
+    than access_resolution seconds. The first such hit in a process is
+    written at once; later ones are collected and written together once
+    access_resolution has passed since the last write (or access_batch are
+    waiting), before each insert, on :meth:`flush` and at exit, so hits
+    rarely take the write lock."""
+    def __init__(self, path, maxsize=None, maxbytes=None, timeout=60.0,
+            access_resolution=60.0, access_batch=100):
+        if sqlite3 is None:
+            raise ImportError("persistent_memo requires sqlite3")
+        self.path = path
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.timeout = timeout
+        self.access_resolution = access_resolution
+        self.access_batch = access_batch
+        self._local = threading.local()
+        # key -> access time not written yet, shared by this process' threads
+        self._accessed = {}
+        self._accessed_pid = os.getpid()
+        self._flushed = 0.0
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # made by another process meanwhile
+                    if not os.path.isdir(directory):
+                        raise
+            # transactions are begun explicitly, see _begin
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                    isolation_level=None)
+            # readers don't block the writer (and vice versa) in WAL mode
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                self._begin(conn)
+                conn.execute('CREATE TABLE IF NOT EXISTS memo (key TEXT '
+                        'PRIMARY KEY, func TEXT, value BLOB, size INTEGER, '
+                        'created REAL, accessed REAL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS memo_accessed ON '
+                        'memo (accessed)')
+                conn.execute('CREATE INDEX IF NOT EXISTS memo_func ON '
+                        'memo (func)')
+                conn.execute('CREATE TABLE IF NOT EXISTS memo_totals (id '
+                        'INTEGER PRIMARY KEY, count INTEGER, size INTEGER)')
+                # counted once, for databases made before the totals table
+                conn.execute('INSERT OR IGNORE INTO memo_totals SELECT 0, '
+                        'count(*), coalesce(sum(size), 0) FROM memo')
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _begin(self, conn):
+        """ starts a transaction holding the write lock"""
+        conn.execute('BEGIN IMMEDIATE')
+
+    def get(self, key, ttl=None):
+        """ :returns: (True, value) or (False, None) if key isn't stored (or
+        is older than ttl)"""
+        conn = self.connection()
+        row = conn.execute('SELECT value, created, accessed FROM memo WHERE '
+                'key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        now = time.time()
+        if ttl is not None and row[1] + ttl <= now:
+            return False, None
+        if now - row[2] >= self.access_resolution:
+            with self._lock:
+                accessed = self._pending()
+                accessed[key] = now
+                due = (len(accessed) >= self.access_batch
+                       or now - self._flushed >= self.access_resolution)
+            if due:
+                self.flush()
+        return True, pickle.loads(bytes(row[0]))
+
+    def _pending(self):
+        """ the access times waiting to be written (call with the lock
+        held); a forked child starts with none"""
+        if self._accessed_pid != os.getpid():
+            self._accessed = {}
+            self._accessed_pid = os.getpid()
+            self._flushed = 0.0
+        return self._accessed
+
+    def _take_accessed(self):
+        with self._lock:
+            accessed = self._pending()
+            self._accessed = {}
+            self._flushed = time.time()
+        return accessed
+
+    def _write_accessed(self, conn, accessed):
+        if accessed:
+            conn.executemany('UPDATE memo SET accessed = ? WHERE key = ?',
+                    [(now, key) for key, now in accessed.items()])
+
+    def flush(self):
+        """ writes the access times collected so far"""
+        accessed = self._take_accessed()
+        if accessed:
+            conn = self.connection()
+            with conn:
+                self._begin(conn)
+                self._write_accessed(conn, accessed)
+
+    def set(self, key, func, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        accessed = self._take_accessed()
+        conn = self.connection()
+        with conn:
+            self._begin(conn)
+            self._write_accessed(conn, accessed)
+            old = conn.execute('SELECT size FROM memo WHERE key = ?',
+                    (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?, '
+                    '?)', (key, func, sqlite3.Binary(data), len(data), now,
+                        now))
+            if old is None:
+                self._add_totals(conn, 1, len(data))
+            else:
+                self._add_totals(conn, 0, len(data) - old[0])
+            self._evict(conn)
+
+    def _add_totals(self, conn, count, size):
+        conn.execute('UPDATE memo_totals SET count = count + ?, size = size '
+                '+ ? WHERE id = 0', (count, size))
+
+    def _evict(self, conn):
+        """ deletes least recently used rows until within the limits"""
+        if self.maxsize is None and self.maxbytes is None:
+            return
+        count, nbytes = conn.execute(
+                'SELECT count, size FROM memo_totals WHERE id = 0').fetchone()
+        over_count = self.maxsize is not None and count > self.maxsize
+        over_bytes = self.maxbytes is not None and nbytes > self.maxbytes
+        if not (over_count or over_bytes):
+            return
+        # walk from the oldest (along the index) until within both limits
+        keys = []
+        freed = 0
+        for key, size in conn.execute(
+                'SELECT key, size FROM memo ORDER BY accessed'):
+            if ((self.maxsize is None or count - len(keys) <= self.maxsize)
+                    and (self.maxbytes is None
+                         or nbytes - freed <= self.maxbytes)):
+                break
+            keys.append(key)
+            freed += size
+        conn.executemany('DELETE FROM memo WHERE key = ?',
+                [(key,) for key in keys])
+        self._add_totals(conn, -len(keys), -freed)
+
+    def count(self, func):
+        return self.connection().execute(
+                'SELECT count(*) FROM memo WHERE func = ?', (func,)
+                ).fetchone()[0]
+
+    def clear(self, func):
+        conn = self.connection()
+        with conn:
+            self._begin(conn)
+            count, size = conn.execute('SELECT count(*), coalesce(sum(size), '
+                    '0) FROM memo WHERE func = ?', (func,)).fetchone()
+            conn.execute('DELETE FROM memo WHERE func = ?', (func,))
+            self._add_totals(conn, -count, -size)
+
+def persistent_memo(f=None, path=None, version=None, maxsize=None,
+        maxbytes=None, ttl=None, key=make_key):
+    """like :func:`memo`, but results are pickled into an sqlite database at
+    path (default :func:`default_memo_path`), so they are shared by every
+    process using it and survive restarts. Works bare or with options.
+
+    Entries are keyed by a sha1 of the function's module and name, its
+    version and the pickled key(args, kwargs), so arguments must pickle the
+    same way each run (calls that can't be keyed, or results that can't be
+    pickled, just aren't cached).
+
+    :param version: anything identifying the function's behaviour. Defaults
+        to :func:`function_version`, so editing the function invalidates
+        its old results (they stay on disk until evicted or cleared with
+        ``cache_clear()``). Pass your own if it depends on other code or
+        data.
+    :param maxsize: max entries in the whole database (all functions), least
+        recently used evicted first (access times are recorded to within
+        a minute: among entries used within the same minute the oldest
+        goes first, and a process's hits are written to the database at
+        most a minute late, or when it exits)
+    :param maxbytes: max total size of the pickled results in the database
+    :param ttl: results older than this many seconds are recomputed
+    :param key: as for :func:`memo`
+
+    Safe for many threads and processes at once: sqlite locks the file, and
+    WAL mode lets readers go on while one process writes. The decorated
+    function gets ``cache_info()`` (hits and misses are per process,
+    currsize counts this function's entries) and ``cache_clear()``.
+    """
+    if f is None:
+        return lambda f: persistent_memo(f, path, version, maxsize, maxbytes,
+                ttl, key)
+    store = _MemoStore(path or default_memo_path(), maxsize, maxbytes)
+    name = '%s.%s' % (f.__module__, getattr(f, '__qualname__', f.__name__))
+    if version is None:
+        version = function_version(f)
+    prefix = pickle.dumps((name, version), 2)
+    stats = {'hits': 0, 'misses': 0}
+    lock = threading.Lock()
+    def count(stat):
+        with lock:
+            stats[stat] += 1
+    def _f(*args, **kwargs):
+        try:
+            digest = hashlib.sha1(prefix)
+            digest.update(pickle.dumps(key(args, kwargs), 2))
+            k = digest.hexdigest()
+        except Exception:
+            # unpicklable arguments, can't be cached
+            count('misses')
+            return f(*args, **kwargs)
+        found, value = store.get(k, ttl)
+        if found:
+            count('hits')
+            return value
+        count('misses')
+        result = f(*args, **kwargs)
+        try:
+            store.set(k, name, result)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            pass
+        return result
+    def cache_info():
+        store.flush()
+        return CacheInfo(stats['hits'], stats['misses'], maxsize,
+                store.count(name))
+    def cache_clear():
+        store.clear(name)
+        with lock:
+            stats['hits'] = stats['misses'] = 0
+    _update_metadata(_f, f)
+    _f.cache_info = cache_info
+    _f.cache_clear = cache_clear
     return _f
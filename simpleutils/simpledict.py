@@ -7,12 +7,26 @@ utilities for handling Python dicts.
 * Implementation (and suggestion to use override the :meth:`~collections.defaultdict.__missing__` method
   of :class:`collections.defaultdict` instead of subclassing dict, are credit `Jochen Ritzel`_
   of Stack Overflow
+* :class:`boundeddefaultfunctiondict` is a size/memory/ttl-bounded version
+  with hit/miss/eviction counters, for long-lived caches
+* :class:`concurrentdefaultfunctiondict` (threads) and
+  :class:`asyncdefaultfunctiondict` (asyncio) make sure concurrent misses on
+  a key only call the factory once
 
 .. _Jochen Ritzel : http://stackoverflow.com/users/95612/jochen-ritzel
 
 """
 
-from collections import defaultdict
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+try:
+    import asyncio
+except ImportError:
+    # python 2
+    asyncio = None
+
 class defaultfunctiondict(defaultdict):
     """ like a defaultdict, but instead takes in a function factory that
     takes a single argument -- a key, and returns a value
@@ -27,63 +41,691 @@ class defaultfunctiondict(defaultdict):
         ret = self[key] = self.default_factory(key)
         return ret
 
-from collections import defaultdict
+class _Flight(object):
+    """ one in-progress default_factory call that other threads can wait on"""
+    __slots__ = ('done', 'value', 'error', 'thread')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = self.error = None
+        self.thread = threading.current_thread()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class concurrentdefaultfunctiondict(defaultfunctiondict):
+    """ thread-safe, single-flight :class:`defaultfunctiondict`: when several
+    threads miss the same key at once, default_factory runs once and the
+    other threads wait for (and share) its result. Threads missing
+    different keys never wait on each other, as the factory runs outside
+    the dict's lock.
+
+    If default_factory raises, every thread waiting on that key gets the
+    exception and nothing is stored, so the next miss tries again.
+    """
+    def __init__(self, *args, **kwargs):
+        super(concurrentdefaultfunctiondict, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __missing__(self, key):
+        if self.default_factory is None:
+            raise KeyError(key)
+        with self._lock:
+            # another thread may have stored it since the lookup failed
+            if key in self:
+                return dict.__getitem__(self, key)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            elif flight.thread is threading.current_thread():
+                raise RuntimeError("default_factory for %r needs its own "
+                        "key" % (key,))
+        if not leader:
+            return flight.wait()
+        try:
+            value = self.default_factory(key)
+        except BaseException as e:
+            with self._lock:
+                del self._flights[key]
+            flight.error = e
+            flight.done.set()
+            raise
+        with self._lock:
+            self[key] = value
+            del self._flights[key]
+        flight.value = value
+        flight.done.set()
+        return value
+
+    def __reduce__(self):
+        # locks can't be pickled, a copy starts without any flights
+        return (self.__class__, (self.default_factory,), None, None,
+                iter(self.items()))
+
+class asyncdefaultfunctiondict(defaultfunctiondict):
+    """ :class:`defaultfunctiondict` for a coroutine function default_factory
+    (needs asyncio): missing keys store and return an :class:`asyncio.Task`
+    running ``default_factory(key)``, so ``value = await d[key]`` (or
+    ``yield from d[key]``) from any number of coroutines shares one call.
+    Tasks that fail or are cancelled are removed, so the next miss tries
+    again.
+
+    As the task is shared, cancelling one awaiter cancels it for all; await
+    ``asyncio.shield(d[key])`` if that matters.
+    """
+    def __missing__(self, key):
+        if self.default_factory is None:
+            raise KeyError(key)
+        if asyncio is None:
+            raise ImportError("asyncdefaultfunctiondict requires asyncio")
+        task = self[key] = asyncio.ensure_future(self.default_factory(key))
+        task.add_done_callback(lambda task: self._forget_failed(key, task))
+        return task
+
+    def _forget_failed(self, key, task):
+        if task.cancelled() or task.exception() is not None:
+            if self.get(key) is task:
+                del self[key]
+
+# snapshot of a boundeddefaultfunctiondict's counters: hits, misses,
+# evictions (to stay within maxsize/maxmemory), expirations (past ttl),
+# currsize (number of entries) and nbytes (measured size of the entries)
+CacheStats = namedtuple('CacheStats',
+        'hits misses evictions expirations currsize nbytes')
+
+def _move_to_end(ordered, key):
+    # OrderedDict.move_to_end is python 3 only
+    ordered[key] = ordered.pop(key)
+
+if hasattr(OrderedDict, 'move_to_end'):
+    _move_to_end = OrderedDict.move_to_end
+
+def _entry_size(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+class boundeddefaultfunctiondict(defaultfunctiondict):
+    """ :class:`defaultfunctiondict` for use as a cache: entries are evicted
+    least recently used first to keep it within maxsize entries and/or
+    maxmemory bytes, and (with ttl) expire ttl seconds after they were
+    stored. Missing and expired keys are (re)computed by default_factory as
+    usual.
+
+    Lookups, misses, evictions and expirations are counted (see
+    :meth:`stats` and :meth:`hit_rate`) so the limits can be set from real
+    hit rates. :meth:`get` and ``in`` don't call default_factory and don't
+    count as hits or misses.
+
+    :param maxsize: maximum number of entries
+    :param ttl: seconds after which an entry expires
+    :param maxmemory: maximum total size in bytes, as measured by sizeof
+        (entries are only measured if this is set)
+    :param sizeof: function (key, value) -> size in bytes of an entry.
+        The default adds up :func:`sys.getsizeof` of both, which does not
+        follow references, so pass your own for nested values.
+    :param timer: clock used for ttl
+
+    Not thread-safe.
+    """
+    def __init__(self, default_factory=None, maxsize=None, ttl=None,
+            maxmemory=None, sizeof=_entry_size, timer=time.time):
+        super(boundeddefaultfunctiondict, self).__init__(default_factory)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxmemory = maxmemory
+        self.sizeof = sizeof
+        self.timer = timer
+        # key -> (expiry time or None, size), least recently used first
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __getitem__(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] is None or self.timer() < entry[0]:
+                self.hits += 1
+                if self.maxsize is not None or self.maxmemory is not None:
+                    _move_to_end(self._entries, key)
+                return dict.__getitem__(self, key)
+            self._expire(key)
+        self.misses += 1
+        return self.__missing__(key)
+
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self._forget(key)
+        dict.__setitem__(self, key, value)
+        size = self.sizeof(key, value) if self.maxmemory is not None else 0
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires, size)
+        self.nbytes += size
+        self._shrink()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._forget(key)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and (entry[0] is None
+                or self.timer() < entry[0])
+
+    def get(self, key, default=None):
+        if key in self:
+            return dict.__getitem__(self, key)
+        return default
+
+    def pop(self, key, *default):
+        if key in self._entries:
+            self._forget(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._forget(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        dict.clear(self)
+        self._entries.clear()
+        self.nbytes = 0
+
+    def copy(self):
+        new = self.__class__(self.default_factory, self.maxsize, self.ttl,
+                self.maxmemory, self.sizeof, self.timer)
+        new.update(self)
+        return new
+
+    def __reduce__(self):
+        return (self.__class__, (self.default_factory, self.maxsize,
+            self.ttl, self.maxmemory, self.sizeof, self.timer), None, None,
+            iter(self.items()))
+
+    def purge(self):
+        """ removes every expired entry (they are otherwise only removed
+        when looked up, or when old enough to be at the front of the LRU
+        order as new entries are stored)"""
+        now = self.timer()
+        for key, (expires, size) in list(self._entries.items()):
+            if expires is not None and expires <= now:
+                self._expire(key)
+
+    def stats(self):
+        """ :returns: :class:`CacheStats` for the counters so far"""
+        return CacheStats(self.hits, self.misses, self.evictions,
+                self.expirations, len(self._entries), self.nbytes)
+
+    def hit_rate(self):
+        """ :returns: fraction of lookups that were hits (0.0 if none yet)"""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _forget(self, key):
+        expires, size = self._entries.pop(key)
+        self.nbytes -= size
+
+    def _expire(self, key):
+        dict.__delitem__(self, key)
+        self._forget(key)
+        self.expirations += 1
+
+    def _shrink(self):
+        """ drops expired entries at the front, then least recently used ones
+        until within the limits (the newest entry always stays)"""
+        entries = self._entries
+        if self.ttl is not None:
+            now = self.timer()
+            while len(entries) > 1:
+                key = next(iter(entries))
+                if entries[key][0] > now:
+                    break
+                self._expire(key)
+        while len(entries) > 1 and (
+                (self.maxsize is not None and len(entries) > self.maxsize) or
+                (self.maxmemory is not None and self.nbytes > self.maxmemory)):
+            key = next(iter(entries))
+            dict.__delitem__(self, key)
+            self._forget(key)
+            self.evictions += 1
+
+from array import array
+from itertools import chain, islice
+try:
+    # python 2
+    from itertools import imap, izip
+    _INTEGER_TYPES = (int, long)
+except ImportError:
+    imap, izip = map, zip
+    _INTEGER_TYPES = (int,)
+    xrange = range
+try:
+    # python3
+    from collections.abc import Mapping
+except ImportError:
+    # or python 2.x
+    from collections import Mapping
+from operator import itemgetter
+from .simplesets import get_all_keys, sample_keys
+
+def merge_fieldnames(all_names, fieldnames=None, key_sorter=None,
+        ignore_keys=None):
+    """ :returns: tuple of fieldnames (minus ignore_keys) followed by any
+    other names in all_names, sorted by key_sorter. This is how
+    :func:`dicts_to_list` orders its columns."""
+    ignore_keys = set(ignore_keys or ())
+    fieldnames = tuple(elem for elem in fieldnames or ()
+                       if elem not in ignore_keys)
+    extra_names = sorted(set(all_names).difference(fieldnames, ignore_keys),
+            key = key_sorter)
+    return fieldnames + tuple(extra_names)
 
 def dicts_to_list(lstofdicts, fieldnames = None, key_sorter = None,
-        ignore_keys = None):
+        ignore_keys = None, column_major = False):
     """ given an ordered list of fieldnames and an optional key_sorter,
     returns (fieldnames, lstoflsts) a list of fieldnames (in order) and the list of dicts as a list of
     lists (optional: ignore_keys...list of keys to leave out from dict
-    conversion)"""
-    if ignore_keys is None:
-        ignore_keys = tuple()
-    if fieldnames is None:
-        fieldnames = tuple()
-    else:
-        # remove any keys in ignore_keys from fieldnames and convert to tuple
-        fieldnames = tuple(elem for elem in fieldnames if elem not in ignore_keys)
+    conversion). Missing keys become None.
+
+    lstofdicts can be any iterable of dicts (generators are read into a
+    list first) or a :class:`RecordTable`, whose columns keep their order
+    instead of being sorted. If column_major, lstoflsts holds one list per
+    fieldname instead of one per dict."""
+    if isinstance(lstofdicts, RecordTable):
+        return lstofdicts.to_list(fieldnames, key_sorter, ignore_keys,
+                column_major)
+    if not isinstance(lstofdicts, list):
+        lstofdicts = list(lstofdicts)
     try:
         all_names = set(get_all_keys(lstofdicts))
     except Exception as inst:
         print("Couldn't grab all keys...probably won't work.")
-        print("MESSAGE: {!r}".format(inst.MESSAGE))
+        print("MESSAGE: {!r}".format(getattr(inst, 'message', inst)))
         print("ARGS: {!r}".format(inst.args))
         all_names = lstofdicts[0].keys()
-    # just get the names that *aren't* in fieldnames (or ignore keys) already, then sort by
-    # given keyfunction
-    extra_names = sorted(all_names.difference(set(fieldnames),
-        set(ignore_keys)), key = key_sorter)
+    given = merge_fieldnames((), fieldnames, ignore_keys=ignore_keys)
+    fieldnames = merge_fieldnames(all_names, given, key_sorter, ignore_keys)
+    extra_names = fieldnames[len(given):]
     if extra_names:
-        print("Found additional fieldnames: {!r}".format(extra_names))
-    fieldnames += tuple(extra_names)
-    output = defaultdict(lambda : [None] * len(fieldnames))
-    for row, dct in enumerate(lstofdicts):
-        # assign each dict, in order, to a row
-        curr = output[row]
-        for i, k in enumerate(fieldnames):
-            # for each key in fieldnames, store the key from current dict in
-            # the current row. If the dict doesn't have the particular key,
-            # just keep going
-            try:
-                curr[i] = dct[k]
-            except KeyError:
-                pass
-    output = [output[k] for k in range(max(output.keys()) + 1)]
-    return fieldnames, output
+        print("Found additional fieldnames: {!r}".format(list(extra_names)))
+    if column_major:
+        return fieldnames, [_column(lstofdicts, k) for k in fieldnames]
+    return fieldnames, _rows(lstofdicts, fieldnames)
+
+def _rows(lstofdicts, fieldnames):
+    """ one list of values per dict, in fieldnames order"""
+    if not fieldnames:
+        return [[] for dct in lstofdicts]
+    # fast path: itemgetter looks up every key in C, but needs all of them
+    getter = itemgetter(*fieldnames)
+    try:
+        if len(fieldnames) == 1:
+            return [[value] for value in imap(getter, lstofdicts)]
+        return [list(row) for row in imap(getter, lstofdicts)]
+    except KeyError:
+        return [list(imap(dct.get, fieldnames)) for dct in lstofdicts]
+
+def _column(lstofdicts, key):
+    """ the values for key in every dict"""
+    try:
+        return list(imap(itemgetter(key), lstofdicts))
+    except KeyError:
+        return [dct.get(key) for dct in lstofdicts]
 
 def list_to_dict(lst):
     return dict((i, elem) for i, elem in enumerate(lst))
 
-def dicts_to_namedtuples(lstofdicts, classname = 'Fields', fieldnames = None, key_sorter = None):
+# (classname, fieldnames) -> namedtuple class, see namedtuple_class
+_namedtuple_classes = {}
+
+def _field_name(name):
+    """ name as a namedtuple field: numbers get an 'f' in front ('1' -> 'f1')"""
+    name = str(name)
+    if name[:1].isdigit():
+        return 'f' + name
+    return name
+
+def namedtuple_class(classname, fieldnames):
+    """ :returns: the namedtuple class for classname and fieldnames (numbers
+    converted as in :func:`dicts_to_namedtuples`, other invalid names
+    renamed), created on first use and reused after that"""
+    key = (classname, tuple(fieldnames))
+    try:
+        return _namedtuple_classes[key]
+    except KeyError:
+        NewClass = namedtuple(classname, [_field_name(name) for name in fieldnames],
+                rename=True)
+        return _namedtuple_classes.setdefault(key, NewClass)
+
+def dicts_to_namedtuples(lstofdicts, classname = 'Fields', fieldnames = None,
+        key_sorter = None, lazy = False, sample_size = 1000):
     """ works exactly the same as convert_dict_to_list, but creates a
     namedtuple with the elements used as fieldnames. Numbers converted to
     'f'+# (e.g. '1' --> 'f1').
     Note that additional namedtuples can be made by using the obj._make
     function of any element returned from this function, or by grabbing the class
     from :meth:`~object.__class__`
+
+    Classes come from :func:`namedtuple_class`, so calls with the same
+    classname and fieldnames share one class.
+
+    :param lazy: return an iterator that converts one dict at a time
+        instead of a list. If lstofdicts isn't a list (or
+        :class:`RecordTable`), additional fieldnames are only looked for in
+        its first ``sample_size`` dicts.
     """
-    from collections import namedtuple
-    fieldnames, data = dicts_to_list(lstofdicts, fieldnames=fieldnames,
-            key_sorter=key_sorter)
-    NewClass = namedtuple(classname, fieldnames)
-    return map(NewClass._make, data)
+    if not lazy:
+        fieldnames, data = dicts_to_list(lstofdicts, fieldnames=fieldnames,
+                key_sorter=key_sorter)
+        return list(imap(namedtuple_class(classname, fieldnames)._make,
+                data))
+    if isinstance(lstofdicts, RecordTable):
+        names = lstofdicts.merge_fieldnames(fieldnames, key_sorter)
+        rows = lstofdicts.rows(names)
+    else:
+        if isinstance(lstofdicts, list):
+            keys = get_all_keys(lstofdicts)
+        else:
+            keys, lstofdicts = sample_keys(lstofdicts, sample_size)
+        names = merge_fieldnames(keys, fieldnames, key_sorter)
+        rows = (imap(dct.get, names) for dct in lstofdicts)
+    return imap(namedtuple_class(classname, names)._make, rows)
+
+# array typecodes used for compact columns, and the exact types each holds
+_ARRAY_TYPES = (('l', _INTEGER_TYPES), ('d', (float,)))
+
+def _compact(column):
+    """ column as an array of longs or doubles if all its values fit,
+    otherwise as is"""
+    for typecode, types in _ARRAY_TYPES:
+        # bools are ints, but wouldn't come back out as bools
+        if column and all(type(value) in types for value in column):
+            try:
+                return array(typecode, column)
+            except OverflowError:
+                pass
+    return column
+
+class Record(object):
+    """ read-only, dict-like view of one row of a :class:`RecordTable`.
+    Holds nothing but the table and a row number, so making one is cheap;
+    use dict(record) for a real copy."""
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        try:
+            position = self._table._positions[key]
+        except KeyError:
+            raise KeyError(key)
+        return self._table.columns[position][self._index]
+
+    def get(self, key, default=None):
+        position = self._table._positions.get(key)
+        if position is None:
+            return default
+        return self._table.columns[position][self._index]
+
+    def keys(self):
+        return list(self._table.fieldnames)
+
+    def values(self):
+        return [column[self._index] for column in self._table.columns]
+
+    def items(self):
+        return list(izip(self._table.fieldnames, self.values()))
+
+    def __iter__(self):
+        return iter(self._table.fieldnames)
+
+    def __len__(self):
+        return len(self._table.fieldnames)
+
+    def __contains__(self, key):
+        return key in self._table._positions
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return "Record(%r)" % dict(self.items())
+
+Mapping.register(Record)
+
+class RecordTable(object):
+    """ compact table of records with one shared list of fieldnames and one
+    column per field, instead of a dict per row. Columns of nothing but ints
+    or nothing but floats are stored as :class:`array.array` (8 bytes per
+    value), everything else in lists. Missing values are None.
+
+    Indexing gives :class:`Record` views (slicing gives a new table) and
+    iterating yields them, so a RecordTable can be used wherever a list of
+    dicts is read. :func:`dicts_to_list` and the simplecsv/simplexls
+    ``write_dict`` functions read the columns directly.
+
+    :param fieldnames: column names, in order
+    :param columns: one sequence of values per fieldname (default empty)
+    :param compact: store int/float columns as arrays
+    """
+    def __init__(self, fieldnames, columns=None, compact=True):
+        self.fieldnames = tuple(fieldnames)
+        self._positions = dict((name, i) for i, name in
+                               enumerate(self.fieldnames))
+        if len(self._positions) != len(self.fieldnames):
+            raise ValueError("duplicate fieldnames in %r" % (fieldnames,))
+        if columns is None:
+            columns = [[] for name in self.fieldnames]
+        columns = [column if isinstance(column, (list, array))
+                   else list(column) for column in columns]
+        if len(columns) != len(self.fieldnames):
+            raise ValueError("%d columns given for %d fieldnames" % (
+                len(columns), len(self.fieldnames)))
+        if len(set(len(column) for column in columns)) > 1:
+            raise ValueError("columns differ in length")
+        if compact:
+            columns = [_compact(column) for column in columns]
+        self.columns = columns
+        # kept apart from the columns, so a table without fieldnames still
+        # has rows (of empty dicts)
+        self._length = len(columns[0]) if columns else 0
+
+    @classmethod
+    def from_dicts(cls, dicts, fieldnames=None, compact=True):
+        """ builds a table from any iterable of dicts, see :meth:`extend`"""
+        table = cls(fieldnames or (), compact=compact)
+        table.extend(dicts, compact=compact)
+        return table
+
+    @classmethod
+    def from_rows(cls, rows, fieldnames, compact=True):
+        """ builds a table from sequences of values in fieldnames order"""
+        columns = [[] for name in fieldnames]
+        appends = [column.append for column in columns]
+        length = 0
+        for length, row in enumerate(rows, 1):
+            for append, value in izip(appends, row):
+                append(value)
+        table = cls(fieldnames, columns, compact)
+        table._length = length
+        return table
+
+    @classmethod
+    def from_namedtuples(cls, namedtuples, compact=True):
+        """ builds a table from namedtuples, with their _fields as
+        fieldnames"""
+        namedtuples = iter(namedtuples)
+        first = next(namedtuples, None)
+        if first is None:
+            return cls((), compact=compact)
+        return cls.from_rows(chain([first], namedtuples), first._fields,
+                compact)
+
+    def append(self, dct):
+        """ adds a row from a dict; new keys become new columns"""
+        n = len(self)
+        new_keys = [key for key in dct if key not in self._positions]
+        for key in sorted(new_keys):
+            self._positions[key] = len(self.fieldnames)
+            self.fieldnames += (key,)
+            self.columns.append([None] * n)
+        get = dct.get
+        array_types = dict(_ARRAY_TYPES)
+        for i, name in enumerate(self.fieldnames):
+            value = get(name)
+            column = self.columns[i]
+            typecode = getattr(column, 'typecode', None)
+            # the array would coerce ints to floats and bools to ints, so
+            # only the exact type goes in, as in _compact
+            if typecode is not None and type(value) in array_types[typecode]:
+                try:
+                    column.append(value)
+                    continue
+                except OverflowError:
+                    pass
+            if typecode is not None:
+                # value doesn't fit the array, fall back to a list
+                column = self.columns[i] = list(column)
+            column.append(value)
+        self._length += 1
+
+    def extend(self, dicts, batch_size=10000, compact=True):
+        """ adds rows from any iterable of dicts, batch_size at a time (so a
+        generator is never held in memory as dicts). New keys become new
+        columns, sorted within each batch. Each batch is compacted (see
+        :meth:`compact`) before it is added, so only one batch of values is
+        ever held as python objects."""
+        dicts = iter(dicts)
+        while True:
+            batch = list(islice(dicts, batch_size))
+            if not batch:
+                break
+            n = len(self)
+            for key in sorted(get_all_keys(batch).difference(self._positions)):
+                self._positions[key] = len(self.fieldnames)
+                self.fieldnames += (key,)
+                self.columns.append([None] * n)
+            for i, name in enumerate(self.fieldnames):
+                values = _column(batch, name)
+                if compact:
+                    values = _compact(values)
+                self._extend_column(i, values)
+            self._length += len(batch)
+
+    def _extend_column(self, i, values):
+        column = self.columns[i]
+        if not column:
+            self.columns[i] = values
+        elif (isinstance(column, array) and isinstance(values, array)
+                and column.typecode == values.typecode):
+            column.extend(values)
+        else:
+            if isinstance(column, array):
+                column = self.columns[i] = column.tolist()
+            column.extend(values)
+
+    def compact(self):
+        """ converts int/float list columns to arrays, returns self"""
+        self.columns = [_compact(column) for column in self.columns]
+        return self
+
+    def column(self, name):
+        """ :returns: the values of the column name"""
+        return self.columns[self._positions[name]]
+
+    def rows(self, fieldnames=None):
+        """ iterates over rows as tuples of values for fieldnames (default
+        all, missing names give None)"""
+        if fieldnames is None:
+            columns = self.columns
+        else:
+            nones = [None] * len(self)
+            columns = [self.columns[self._positions[name]]
+                       if name in self._positions else nones
+                       for name in fieldnames]
+        if not columns:
+            return iter([()] * len(self))
+        return izip(*columns)
+
+    def merge_fieldnames(self, fieldnames=None, key_sorter=None,
+            ignore_keys=None):
+        """ :func:`merge_fieldnames` for the table's columns, which keep
+        their order unless key_sorter is given"""
+        ignore_keys = set(ignore_keys or ())
+        given = merge_fieldnames((), fieldnames, ignore_keys=ignore_keys)
+        rest = [name for name in self.fieldnames
+                if name not in given and name not in ignore_keys]
+        if key_sorter is not None:
+            rest.sort(key=key_sorter)
+        return given + tuple(rest)
+
+    def to_list(self, fieldnames=None, key_sorter=None, ignore_keys=None,
+            column_major=False):
+        """ same as :func:`dicts_to_list` on the table, except that columns
+        not in fieldnames keep the table's order (unless key_sorter is
+        given)"""
+        names = self.merge_fieldnames(fieldnames, key_sorter, ignore_keys)
+        if column_major:
+            nones = [None] * len(self)
+            return names, [list(self.columns[self._positions[name]])
+                           if name in self._positions else list(nones)
+                           for name in names]
+        return names, [list(row) for row in self.rows(names)]
+
+    def to_dicts(self):
+        """ :returns: the rows as a list of dicts"""
+        return [dict(izip(self.fieldnames, row)) for row in self.rows()]
+
+    def to_namedtuples(self, classname='Row'):
+        """ :returns: the rows as a list of namedtuples (see
+        :func:`namedtuple_class` for how fieldnames are converted)"""
+        NewClass = namedtuple_class(classname, self.fieldnames)
+        return list(imap(NewClass._make, self.rows()))
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            table = RecordTable(self.fieldnames,
+                    [column[index] for column in self.columns],
+                    compact=False)
+            table._length = len(xrange(*index.indices(len(self))))
+            return table
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("record index out of range")
+        return Record(self, index)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield Record(self, i)
+
+    def __repr__(self):
+        return "<RecordTable %r, %d rows>" % (self.fieldnames, len(self))
@@ -1,12 +1,33 @@
 """
 File handling utilities.
 
+:func:`get_fileobject` (used by all the readers and writers) transparently
+handles gzip, bz2 and xz compressed files: compression is detected from the
+file's magic bytes when reading and from its extension ('.gz', '.bz2',
+'.xz'/'.lzma') when writing. With ``atomic=True``, output goes to a temporary
+file that only replaces the real one once it is closed successfully (see
+:class:`AtomicFile`), so a crash never leaves a truncated file behind.
 """
 
+import bz2
+import gzip
+import os
+import stat
+import tempfile
+
+try:
+    import lzma
+except ImportError:
+    # python 2 needs the backports.lzma package for xz
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
 from simpletime import pretty_time
 def make_filename(filename=None,ext='', prefix='', name_gen=pretty_time,
         append_time = False):
-    if filename is None: 
+    if filename is None:
         if append_time and name_gen is pretty_time:
             filename = ''
         else:
@@ -15,7 +36,160 @@ def make_filename(filename=None,ext='', prefix='', name_gen=pretty_time,
         filename = filename + pretty_time()
     return prefix+filename+ext
 
-def get_fileobject(filename, mode, ext, prefix=''):
+# extension -> compression, used when writing (reading goes by magic bytes)
+COMPRESSION_EXTENSIONS = {
+        '.gz': 'gzip',
+        '.bz2': 'bz2',
+        '.xz': 'xz',
+        '.lzma': 'xz',
+        }
+
+# leading bytes of compressed files
+_MAGIC_BYTES = (
+        ('\x1f\x8b', 'gzip'),
+        ('BZh', 'bz2'),
+        ('\xfd7zXZ\x00', 'xz'),
+        )
+
+# keywords that readers/writers pass on to get_fileobject
+FILE_OPTIONS = ('compression', 'compresslevel', 'buffering', 'atomic',
+        'fsync')
+
+def pop_file_options(kwargs):
+    """ removes the :func:`get_fileobject` keywords (see
+    :data:`FILE_OPTIONS`) from kwargs and returns them as a dict, so callers
+    can pass the rest on to csv etc."""
+    return dict((k, kwargs.pop(k)) for k in FILE_OPTIONS if k in kwargs)
+
+def detect_compression(filename, mode='rb'):
+    """ :returns: 'gzip', 'bz2', 'xz' or None for the file at filename.
+    When reading an existing file, only its first bytes decide (a file that
+    matches no magic bytes is read uncompressed, whatever its extension);
+    otherwise its extension does."""
+    if 'r' in mode and os.path.isfile(filename):
+        with open(filename, 'rb') as f:
+            start = f.read(6)
+        for magic, compression in _MAGIC_BYTES:
+            if start.startswith(magic):
+                return compression
+        return None
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+def _open(filename, mode, compression=None, compresslevel=None, buffering=-1):
+    """ opens filename, (de)compressing with the given compression"""
+    if not compression:
+        return open(filename, mode, buffering)
+    if compression == 'gzip':
+        raw = open(filename, mode, buffering)
+        f = gzip.GzipFile(fileobj=raw, mode=mode,
+                compresslevel=9 if compresslevel is None else compresslevel)
+        # GzipFile only closes files it opened itself
+        f.myfileobj = raw
+        return f
+    if compression == 'bz2':
+        return bz2.BZ2File(filename, mode, max(buffering, 0),
+                9 if compresslevel is None else compresslevel)
+    if compression == 'xz':
+        if lzma is None:
+            raise ImportError("xz files require lzma (backports.lzma on "
+                    "python 2), please install it!")
+        if 'w' in mode or 'a' in mode:
+            return lzma.LZMAFile(filename, mode, preset=compresslevel)
+        return lzma.LZMAFile(filename, mode)
+    raise ValueError("unknown compression %r, expected one of %r" % (
+        compression, sorted(set(COMPRESSION_EXTENSIONS.values()))))
+
+# os.replace is python 3.3+, rename is atomic on POSIX too
+_replace = getattr(os, 'replace', os.rename)
+
+# read once: os.umask can only be read by setting it, which would race
+# with other threads creating files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class AtomicFile(object):
+    """ writable file-like object that writes to a temporary file in the
+    same directory as filename, and moves it to filename (with
+    :func:`os.replace`) when closed. Call :meth:`discard` instead of
+    :meth:`close` to throw the output away; used as a context manager it
+    discards if the block raises.
+
+    :param opener: function that opens the temporary path for writing
+    :param fsync: if True, the data is flushed to disk before the rename, so
+        the file is complete even after a power failure
+    """
+    def __init__(self, filename, opener=open, fsync=False):
+        self.name = filename
+        self.fsync = fsync
+        directory, base = os.path.split(os.path.abspath(filename))
+        fd, self.tempname = tempfile.mkstemp(dir=directory,
+                prefix='.%s.' % base, suffix='.tmp')
+        os.close(fd)
+        try:
+            self.fileobj = opener(self.tempname)
+        except:
+            os.remove(self.tempname)
+            raise
+        self.closed = False
+
+    def __getattr__(self, name):
+        # write, tell, flush etc. go straight to the temporary file
+        if name == 'fileobj':
+            raise AttributeError(name)
+        return getattr(self.fileobj, name)
+
+    def close(self):
+        """ closes the temporary file and moves it into place"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.fileobj.close()
+            # mkstemp files are private: keep the permissions of the file
+            # being replaced, or give a new one the usual permissions
+            try:
+                mode = stat.S_IMODE(os.stat(self.name).st_mode)
+            except OSError:
+                mode = 0666 & ~_UMASK
+            os.chmod(self.tempname, mode)
+            if self.fsync:
+                fd = os.open(self.tempname, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            _replace(self.tempname, self.name)
+        except:
+            if os.path.exists(self.tempname):
+                os.remove(self.tempname)
+            raise
+
+    def discard(self):
+        """ closes and removes the temporary file, leaving filename alone"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.fileobj.close()
+        finally:
+            os.remove(self.tempname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def discard_fileobject(f):
+    """ for writers that fail part way: discards the output of an
+    :class:`AtomicFile`, just closes anything else"""
+    getattr(f, 'discard', f.close)()
+
+def get_fileobject(filename, mode, ext='', prefix='', compression='infer',
+        compresslevel=None, buffering=-1, atomic=False, fsync=False):
     """ returns a fileobject for given input.
 
     :param filename: path - str to a path on system
@@ -24,16 +198,35 @@ def get_fileobject(filename, mode, ext, prefix=''):
     :param str mode: - mode for open
     :param str ext: - added to end of filename
     :param str prefix: added to start of filename
+    :param compression: 'infer' (default) detects compression with
+        :func:`detect_compression`, None/False opens the file as is, or one of
+        'gzip', 'bz2', 'xz'. Compressed files are (de)compressed as they
+        are streamed, never through a temporary copy.
+    :param int compresslevel: compression level for writes (default 9, or the
+        xz default preset)
+    :param int buffering: buffer size for the underlying file, as for
+        :func:`open` (not used for xz). Large values turn many small writes
+        into few big sequential ones.
+    :param bool atomic: for writes, return an :class:`AtomicFile` so the
+        file only appears once it is complete (writers discard it on error)
+    :param bool fsync: with atomic, fsync the data before moving it into
+        place
 
     """
     # if it's a string, get the path
     if isinstance(filename,str):
-        f = open(filename,mode)
+        pass
     # if it is not None, assume it's a file object
     elif filename is not None:
-        f = filename
+        return filename
     # otherwise just use default
     else:
         filename = make_filename(filename=filename, ext=ext, prefix=prefix)
-        f = open(filename,mode)
-    return f
+    if compression == 'infer':
+        compression = detect_compression(filename, mode)
+    if atomic and ('w' in mode or 'a' in mode):
+        if 'a' in mode:
+            raise ValueError("atomic files can't be appended to")
+        return AtomicFile(filename, lambda path: _open(path, mode,
+            compression, compresslevel, buffering), fsync=fsync)
+    return _open(filename, mode, compression, compresslevel, buffering)
@@ -0,0 +1,183 @@
+"""
+simpleindex - hash indexes and hash joins over lists of dicts (e.g. from
+:func:`.simplecsv.read_to_dict`, or a :class:`.simpledict.RecordTable`).
+
+:class:`HashIndex` groups rows by the value of one column (or a tuple of
+several) so lookups are a single dict access instead of a scan; the groups
+hold the rows themselves, not copies. :func:`hash_join` builds an index on
+one side and streams the other side past it, so a join is O(n + m) instead
+of a nested loop.
+
+Example::
+
+    orders = simplecsv.read_to_dict('orders.csv')
+    by_customer = HashIndex(orders, 'customer_id')
+    by_customer['42']                   # every order of customer 42
+    customers = simplecsv.iter_dicts('customers.csv')
+    joined = hash_join(customers, orders, on='customer_id', how='left')
+
+Keys are compared as they are stored: ``'42'`` from a csv is not ``42``.
+Missing columns give None, which is matched like any other value.
+"""
+
+def key_function(on):
+    """ :returns: a function row -> key for on: a column name, a list/tuple
+    of column names (keys are then tuples) or a callable (returned as is)"""
+    if callable(on):
+        return on
+    if isinstance(on, (list, tuple)):
+        names = tuple(on)
+        if not names:
+            raise ValueError("need at least one column to index on")
+        return lambda row: tuple([row.get(name) for name in names])
+    return lambda row: row.get(on)
+
+class HashIndex(object):
+    """ index of rows (dicts) by key, built in one pass over rows (any
+    iterable, including generators).
+
+    :param rows: rows to index
+    :param on: column name, list of column names or function row -> key
+    :param unique: if True, raise ValueError when two rows share a key
+
+    ``index[key]`` returns the list of rows with that key (an empty tuple if
+    there are none). The list is the index's own, so don't modify it; use
+    :meth:`add` to add rows.
+    """
+    def __init__(self, rows=(), on=None, unique=False):
+        if on is None:
+            raise ValueError("need a column (or columns, or function) to "
+                    "index on")
+        self.on = on
+        self.unique = unique
+        self.key = key_function(on)
+        self.groups = {}
+        # every column seen in the indexed rows, used for left joins
+        self.columns = set()
+        self.extend(rows)
+
+    def add(self, row):
+        """ adds a single row to the index"""
+        key = self.key(row)
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [row]
+        elif self.unique:
+            raise ValueError("duplicate key %r in unique index" % (key,))
+        else:
+            group.append(row)
+        self.columns.update(row)
+
+    def extend(self, rows):
+        """ adds rows (any iterable) to the index"""
+        key = self.key
+        groups = self.groups
+        columns = self.columns
+        for row in rows:
+            k = key(row)
+            group = groups.get(k)
+            if group is None:
+                groups[k] = [row]
+            elif self.unique:
+                raise ValueError("duplicate key %r in unique index" % (k,))
+            else:
+                group.append(row)
+            columns.update(row)
+
+    def __getitem__(self, key):
+        return self.groups.get(key, ())
+
+    def get(self, key, default=()):
+        return self.groups.get(key, default)
+
+    def first(self, key, default=None):
+        """ :returns: the first row with key, or default"""
+        group = self.groups.get(key)
+        return group[0] if group else default
+
+    def lookup(self, row):
+        """ :returns: the rows whose key matches that of row (which may come
+        from another table, as long as it has the same columns)"""
+        return self.groups.get(self.key(row), ())
+
+    def __contains__(self, key):
+        return key in self.groups
+
+    def __len__(self):
+        """ number of distinct keys"""
+        return len(self.groups)
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def keys(self):
+        return self.groups.keys()
+
+    def items(self):
+        """ (key, list of rows) pairs"""
+        return self.groups.items()
+
+    def counts(self):
+        """ :returns: dict of key -> number of rows"""
+        return dict((key, len(group)) for key, group in self.groups.items())
+
+    def __repr__(self):
+        return "<HashIndex on %r, %d keys>" % (self.on, len(self.groups))
+
+def group_by(rows, on):
+    """ :returns: a :class:`HashIndex` of rows on ``on``, i.e. a mapping of
+    key -> list of rows (references, not copies)"""
+    return HashIndex(rows, on)
+
+def merge_rows(left, right):
+    """ default row merge for :func:`hash_join`: a new dict with the
+    columns of right, then left (so left wins where both have a column)"""
+    merged = dict(right)
+    merged.update(left)
+    return merged
+
+def hash_join(left, right, on, right_on=None, how='inner', merge=merge_rows):
+    """ joins two tables of dicts on key columns, yielding merged rows.
+
+    right is read once into a :class:`HashIndex` (or can be one already,
+    e.g. to join several tables against it); left is streamed past it, so
+    it can be a generator of any length (e.g.
+    :func:`.simplecsv.iter_dicts`) and rows come out in left's order.
+    Index the smaller table as right.
+
+    :param on: key column(s) (or function) of left, see :func:`key_function`
+    :param right_on: key of right, if it differs (ignored if right is a
+        HashIndex already)
+    :param how: 'inner' - only left rows with a match; 'left' - every left
+        row, unmatched ones merged with a row of None for each of right's
+        columns
+    :param merge: function (left row, right row) -> output row, by default
+        :func:`merge_rows`. Use ``lambda l, r: (l, r)`` to get the original
+        rows (references, not copies).
+    """
+    if how not in ('inner', 'left'):
+        raise ValueError("how must be 'inner' or 'left', not %r" % (how,))
+    if not isinstance(right, HashIndex):
+        right = HashIndex(right, right_on if right_on is not None else on)
+    return _probe(left, right, key_function(on), how == 'left', merge)
+
+def _probe(left, index, key, keep_unmatched, merge):
+    groups = index.groups
+    empty = None
+    for row in left:
+        group = groups.get(key(row))
+        if group:
+            for match in group:
+                yield merge(row, match)
+        elif keep_unmatched:
+            if empty is None:
+                empty = dict.fromkeys(index.columns)
+            yield merge(row, empty)
+
+def inner_join(left, right, on, right_on=None, merge=merge_rows):
+    """ :func:`hash_join` with how='inner'"""
+    return hash_join(left, right, on, right_on, 'inner', merge)
+
+def left_join(left, right, on, right_on=None, merge=merge_rows):
+    """ :func:`hash_join` with how='left'"""
+    return hash_join(left, right, on, right_on, 'left', merge)
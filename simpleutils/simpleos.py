@@ -7,6 +7,8 @@ import re
 import os
 import sys
 
+from .simplefile import get_fileobject
+
 
 def check_root(warnmsg=None, endscript=False):
     """ Checks to see that user id is root (=0) and gives user option to quit
@@ -186,19 +188,21 @@ def get_paths_by_filter(thefilter=None, dirpath=None, use_regex=False):
 
 
 def read_file(path):
-    """reads the file at given path and returns a string"""
-    f = open(path, 'r')
+    """reads the file at given path and returns a string (gzip/bz2/xz files
+    are decompressed, see :func:`.simplefile.get_fileobject`)"""
+    f = get_fileobject(path, 'rb')
     fread = f.read()
     f.close()
     return fread
 
 
 def read_file_by_line(path):
-    """given a path, opens with 'rb' and interactively reads line by line."""
+    """given a path, opens with 'rb' (decompressing like :func:`read_file`)
+    and interactively reads line by line."""
+    f = get_fileobject(path, 'rb')
     try:
         response = None
         i = 0
-        f = open(path, 'rb')
         print "Reading line by line, type q to exit"
         while not (response == 'q'
                    or response == 'quit'
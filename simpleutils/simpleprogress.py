@@ -0,0 +1,128 @@
+"""
+simpleprogress - throttled progress reporting for readers and writers.
+
+Every reader and writer in :mod:`~simpleutils.simplecsv` and
+:mod:`~simpleutils.simplexls` takes a ``progress`` keyword, which is passed
+through :func:`get_progress`:
+
+* ``None``/``False`` (default) - silent. No progress object is created, so
+  the only cost in the hot loop is a single ``is None`` check per batch.
+* ``True`` - print a line to stderr every second or so
+  (:func:`print_progress`)
+* a callable - called with a :class:`ProgressInfo` at each report
+* a :class:`Progress` object - used as is (e.g. to share one metrics sink
+  between several calls or to change the report interval)
+
+Example::
+
+    seen = []
+    simplecsv.write_list(rows, 'out.csv', progress=seen.append)
+    seen[-1].count, seen[-1].nbytes, seen[-1].elapsed
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+# snapshot passed to progress callbacks: label (e.g. 'write_list'), unit
+# ('rows'/'cells'), count processed so far, nbytes read or written so far
+# (None if unknown), elapsed seconds and done (True for the final report)
+ProgressInfo = namedtuple('ProgressInfo',
+        'label unit count nbytes elapsed done')
+
+def print_progress(info, stream=None):
+    """ default progress callback, writes a one-line summary of info to
+    stream (default: stderr)"""
+    stream = stream or sys.stderr
+    rate = info.count / info.elapsed if info.elapsed else 0.0
+    msg = "%s: %d %s in %.1fs (%.0f %s/s)" % (info.label, info.count,
+            info.unit, info.elapsed, rate, info.unit)
+    if info.nbytes is not None:
+        msg += ", %d bytes" % info.nbytes
+    if info.done:
+        msg += ", done"
+    stream.write(msg + "\n")
+
+class Progress(object):
+    """ counts rows/cells/bytes and reports them to callback at most every
+    ``interval`` seconds (plus once when finished).
+
+    :param callback: function taking a :class:`ProgressInfo`
+    :param float interval: minimum number of seconds between reports
+    :param int batch: number of rows readers/writers process between
+        calls to :meth:`update`, so reporting never happens per row
+    :param str label: name used in reports, defaults to the caller's name
+    """
+    def __init__(self, callback=print_progress, interval=1.0, batch=1000,
+            label=None, unit='rows'):
+        self.callback = callback
+        self.interval = interval
+        self.batch = batch
+        self.label = label
+        self.unit = unit
+        self.count = 0
+        self.nbytes = None
+        self.started = None
+        self._next_report = None
+
+    def start(self, label=None, unit=None):
+        """ (re)starts the clock; label/unit only fill in unset values"""
+        if self.label is None: self.label = label
+        if unit is not None: self.unit = unit
+        self.started = time.time()
+        self._next_report = self.started + self.interval
+        return self
+
+    def update(self, count=0, nbytes=None):
+        """ adds count to the number processed and records nbytes as the
+        total number of bytes so far (if known), reporting if the interval
+        has passed"""
+        if self.started is None:
+            self.start()
+        self.count += count
+        if nbytes is not None:
+            self.nbytes = nbytes
+        now = time.time()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            self.report(now)
+
+    def finish(self, nbytes=None):
+        """ records final byte count and sends the last report"""
+        if self.started is None:
+            self.start()
+        if nbytes is not None:
+            self.nbytes = nbytes
+        self.report(done=True)
+
+    def info(self, now=None, done=False):
+        """ :returns: current :class:`ProgressInfo`"""
+        now = now or time.time()
+        return ProgressInfo(self.label, self.unit, self.count, self.nbytes,
+                now - self.started, done)
+
+    def report(self, now=None, done=False):
+        if self.callback is not None:
+            self.callback(self.info(now, done))
+
+def get_progress(progress, label=None, unit='rows'):
+    """ normalizes a ``progress`` keyword (see module docs) to a started
+    :class:`Progress` or None (silent)"""
+    if progress is None or progress is False:
+        return None
+    if progress is True:
+        progress = Progress()
+    elif not isinstance(progress, Progress):
+        if not callable(progress):
+            raise TypeError("progress must be None, a bool, a callable or a "
+                    "Progress object, not %r" % type(progress))
+        progress = Progress(callback=progress)
+    return progress.start(label, unit)
+
+def tell(f):
+    """ :returns: current position of file object f or None if it can't be
+    told (used for byte counts)"""
+    try:
+        return f.tell()
+    except (AttributeError, IOError, ValueError):
+        return None
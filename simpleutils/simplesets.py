@@ -1,10 +1,100 @@
-def get_all_keys(lstofdicts):
+import multiprocessing
+from collections import OrderedDict
+from itertools import chain, islice
+
+def get_all_keys(lstofdicts, sample_size=None, counts=False, processes=None,
+        chunk_size=10000):
     """for a given list of dicts(or dict), returns a set of all the keys within the
-    list. Useful for making header rows for csvs, etc"""
+    list. Useful for making header rows for csvs, etc
+
+    lstofdicts can be any iterable of dicts (generators included); a single
+    dict (anything with a keys method) gives its own keys.
+
+    :param sample_size: only look at the first sample_size dicts
+    :param counts: if True, return an :class:`~collections.OrderedDict` of
+        key -> number of dicts it is in, in the order keys were first seen,
+        instead of a set (e.g. to order fieldnames, or spot sparse columns)
+    :param processes: if more than 1, dicts are sent chunk_size at a time to
+        a :class:`multiprocessing.Pool` of that many workers. Sending the
+        dicts costs more than scanning them for plain keys, so this only
+        pays for huge inputs with counts, on several cores.
+    """
+    if hasattr(lstofdicts, 'keys') and not isinstance(lstofdicts, list):
+        keys = list(lstofdicts.keys())
+        if counts:
+            return OrderedDict((key, 1) for key in keys)
+        return set(keys)
+    if sample_size is not None:
+        lstofdicts = islice(lstofdicts, sample_size)
+    if processes is not None and processes > 1:
+        return _get_all_keys_parallel(lstofdicts, counts, processes,
+                chunk_size)
+    if counts:
+        return _count_keys(lstofdicts)
     myset = set()
     if isinstance(lstofdicts, list):
-        for mydict in lstofdicts:
-            myset.update(mydict.keys())
+        # iterating a dict gives its keys, so set.update does it all in C
+        myset.update(*lstofdicts)
     else:
-        myset.update(lstofdicts.keys())
+        for chunk in _chunks(lstofdicts, chunk_size):
+            myset.update(*chunk)
     return myset
+
+def _chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _count_keys(dicts):
+    """ OrderedDict of key -> number of dicts with it, in first-seen order"""
+    found = {}
+    order = []
+    for mydict in dicts:
+        for key in mydict:
+            count = found.get(key)
+            if count is None:
+                order.append(key)
+                found[key] = 1
+            else:
+                found[key] = count + 1
+    return OrderedDict((key, found[key]) for key in order)
+
+def _chunk_keys(task):
+    chunk, counts = task
+    if counts:
+        return _count_keys(chunk)
+    return set().union(*chunk)
+
+def _get_all_keys_parallel(dicts, counts, processes, chunk_size):
+    """ get_all_keys over chunks of dicts in a pool; chunk results are
+    merged in input order, so first-seen order is kept"""
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.imap(_chunk_keys, ((chunk, counts) for chunk in
+            _chunks(dicts, chunk_size)))
+        if counts:
+            total = OrderedDict()
+            for chunk_counts in results:
+                for key, count in chunk_counts.items():
+                    total[key] = total.get(key, 0) + count
+        else:
+            total = set()
+            for keys in results:
+                total.update(keys)
+        pool.close()
+        return total
+    finally:
+        pool.terminate()
+        pool.join()
+
+def sample_keys(iterable, sample_size=None):
+    """reads up to ``sample_size`` dicts (all of them if None) from
+    iterable and returns a tuple of (keys, rows): the set of keys found in
+    that sample and an iterator over *all* of iterable, sample included.
+    Lets generators be inspected for fieldnames without being consumed."""
+    iterator = iter(iterable)
+    sample = list(islice(iterator, sample_size))
+    return get_all_keys(sample), chain(sample, iterator)
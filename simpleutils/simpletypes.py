@@ -0,0 +1,175 @@
+"""
+simpletypes - type inference and fast column converters for text data
+(e.g. rows read by :mod:`~simpleutils.simplecsv`).
+
+A *schema* is a sequence with one type per column (or a mapping from column
+name to type). Types are given by name:
+
+* ``'int'``, ``'float'``, ``'bool'``, ``'date'`` (ISO, YYYY-MM-DD) or
+  ``'str'``
+* a trailing ``'?'`` (e.g. ``'int?'``) makes the column nullable: empty
+  values become None instead of failing to convert
+* any callable taking the raw string is also accepted
+
+:func:`infer_schema` guesses a schema from a sample of rows and
+:func:`compile_converters` turns a schema into a conversion plan once, which
+:func:`convert_rows` then applies to every row. Columns that need no
+conversion cost nothing per cell.
+"""
+
+import datetime
+from collections import namedtuple
+from operator import methodcaller
+
+# row/column (0-based, name if known), raw value and error message for a
+# cell that couldn't be converted
+ConversionError = namedtuple('ConversionError', 'row column name value error')
+
+_TRUE = frozenset(['true', 't', 'yes', 'y'])
+_FALSE = frozenset(['false', 'f', 'no', 'n'])
+
+def to_bool(value):
+    """ 'true'/'t'/'yes'/'y' -> True, 'false'/'f'/'no'/'n' -> False (any
+    case), otherwise ValueError"""
+    lowered = value.lower()
+    if lowered in _TRUE:
+        return True
+    if lowered in _FALSE:
+        return False
+    raise ValueError("invalid literal for bool: %r" % value)
+
+def to_date(value):
+    """ converts an ISO date string ('2012-08-09') to :class:`datetime.date`"""
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        raise ValueError("invalid literal for date: %r" % value)
+    return datetime.date(int(value[:4]), int(value[5:7]), int(value[8:]))
+
+# converters by type name, in the order they are tried when inferring
+CONVERTERS = (
+        ('bool', to_bool),
+        ('int', int),
+        ('float', float),
+        ('date', to_date),
+        ('str', None),
+        )
+_CONVERTERS = dict(CONVERTERS)
+
+def infer_type(values, nulls=('',)):
+    """ :returns: the name of the first type in :data:`CONVERTERS` that can
+    convert all of values (ignoring nulls), with a '?' appended if any
+    values were null. A column with nothing but nulls is 'str?'."""
+    candidates = [(name, conv) for name, conv in CONVERTERS if conv]
+    nullable = False
+    for value in values:
+        if value in nulls:
+            nullable = True
+            continue
+        remaining = []
+        for name, conv in candidates:
+            try:
+                conv(value)
+            except (ValueError, TypeError):
+                continue
+            remaining.append((name, conv))
+        candidates = remaining
+        if not candidates:
+            break
+    name = candidates[0][0] if candidates else 'str'
+    return name + '?' if nullable else name
+
+def infer_schema(rows, nulls=('',)):
+    """ infers a type for each column of rows (a list of lists), see
+    :func:`infer_type`. Short rows count as nulls in their missing
+    columns; empty rows (blank lines) are left out."""
+    rows = [row for row in rows if row]
+    width = max(len(row) for row in rows) if rows else 0
+    columns = [[] for i in range(width)]
+    for row in rows:
+        for i in range(width):
+            columns[i].append(row[i] if i < len(row) else nulls[0])
+    return [infer_type(column, nulls) for column in columns]
+
+def _converter(spec, encoding=None, nulls=('',)):
+    """ :returns: the callable for a single schema entry, or None if values
+    should be passed through untouched"""
+    if callable(spec):
+        return spec
+    nullable = spec.endswith('?')
+    name = spec.rstrip('?')
+    try:
+        conv = _CONVERTERS[name]
+    except KeyError:
+        raise ValueError("unknown type %r, expected one of %r or a callable"
+                % (spec, [n for n, c in CONVERTERS]))
+    if conv is None:
+        if not encoding:
+            if nullable:
+                return lambda value: value if value not in nulls else None
+            return None
+        conv = methodcaller('decode', encoding)
+    if nullable:
+        if tuple(nulls) == ('',):
+            return lambda value: conv(value) if value else None
+        return lambda value: conv(value) if value not in nulls else None
+    return conv
+
+def compile_converters(schema, fieldnames=None, encoding=None, nulls=('',)):
+    """ compiles schema into a conversion plan: a tuple of (column index,
+    converter) for every column that needs converting. String columns are
+    decoded with encoding (if given) and skipped otherwise.
+
+    :param schema: sequence of types, or a mapping of fieldname -> type (in
+        which case fieldnames is required; unmapped columns are left alone)
+    """
+    if hasattr(schema, 'keys'):
+        if fieldnames is None:
+            raise ValueError("need fieldnames to use a schema keyed by name")
+        schema = [schema.get(name, 'str') for name in fieldnames]
+    plan = []
+    for i, spec in enumerate(schema):
+        conv = _converter(spec, encoding, nulls)
+        if conv is not None:
+            plan.append((i, conv))
+    return tuple(plan)
+
+def convert_rows(rows, plan, errors=None, fieldnames=None, start=0):
+    """ applies a plan from :func:`compile_converters` to each row (a list,
+    converted in place) and yields it.
+
+    Cells that fail to convert are set to None and, if errors is a list, a
+    :class:`ConversionError` is appended to it, so a bad cell never stops
+    the read. start is the row number of the first row (for errors).
+    Empty rows (blank lines) are yielded as they are."""
+    positions = dict((col, pos) for pos, (col, conv) in enumerate(plan))
+    i = None
+    for rownum, row in enumerate(rows, start):
+        if not row:
+            yield row
+            continue
+        try:
+            for i, conv in plan:
+                row[i] = conv(row[i])
+        except (ValueError, TypeError, IndexError, AttributeError):
+            # cells before column i are converted already, redo the rest
+            # one at a time to find every bad one
+            _convert_slowly(row, plan[positions[i]:], rownum, errors,
+                    fieldnames)
+        yield row
+
+def _convert_slowly(row, plan, rownum, errors, fieldnames):
+    for i, conv in plan:
+        if i >= len(row):
+            row.extend([None] * (i + 1 - len(row)))
+            value, message = None, "missing value"
+        else:
+            value = row[i]
+            try:
+                row[i] = conv(value)
+                continue
+            except (ValueError, TypeError, AttributeError) as e:
+                message = str(e)
+        row[i] = None
+        if errors is not None:
+            name = (fieldnames[i] if fieldnames is not None
+                    and i < len(fieldnames) else None)
+            errors.append(ConversionError(rownum, i, name, value, message))
@@ -12,16 +12,31 @@ except ImportError:
     # or python 2.x
     from collections import Mapping
 
-from .simpledict import dicts_to_list, list_to_dict
+import csv
+import datetime
+import multiprocessing
+import os
+import re
+import sys
+from itertools import chain, dropwhile, islice, takewhile
+from xml.etree import ElementTree
+from zipfile import ZipFile
+from .simpledict import dicts_to_list, list_to_dict, merge_fieldnames
 import simpleutils.simplecsv as sc
-from .simplesets import get_all_keys
+from .simplesets import get_all_keys, sample_keys
+from .simpleprogress import get_progress, tell
+from .simplefile import get_fileobject, pop_file_options, discard_fileobject
+import simpleutils.simplefile as sf
 
 Style = openpyxl.style.Style
 
 def make_filename(filename=None, ext='.xlsx', prefix='', **kwargs):
-    """ excel-specific wrapper for make_filename"""
+    """ excel-specific wrapper for make_filename (a given filename is used
+    as is, unless append_time is set)"""
     append_time = kwargs.get("append_time") or False
-    return sc.make_filename(filename=filename, ext=ext, prefix=prefix,
+    if filename is not None and not append_time:
+        return filename
+    return sf.make_filename(filename=filename, ext=ext, prefix=prefix,
             append_time=append_time)
 
 def get_worksheet(workbook=None, sheet_name=None):
@@ -64,16 +79,20 @@ def write_dict(
         col_sort_key = None,
         ignore_keys = None,
         default_style = None,
+        progress = None,
         **kwargs):
-    """Takes a given list of dicts and converts it to an excel file,
-    using similar settings to write_dict in csv.
+    """Takes a given list of dicts (or a :class:`~.simpledict.RecordTable`)
+    and converts it to an excel file, using similar settings to write_dict in
+    csv.
 
     Special Parameters:
 
     :param row_styles: sequence callable by row integer
     :param col_styles: sequence callable by column integer: (where 'A' --> '0')
     :param style_dict: mapping from cell names ('A1') or cell pos((0,1)) to a
-          format object
+          format object. Keys can also be ranges: 'A1:D100', whole columns
+          ('B:B', 'B:D') or whole rows ('1:1', '2:10'), all 1-based as in
+          Excel, and are applied in bulk
     :param workbook: either an openpyxl workbook object or a string denoting the
           desired workbook title.
     :param sheet_name: string - name of sheet in which to store data (if sheet
@@ -84,6 +103,12 @@ def write_dict(
           fieldnames found, remaining fieldnames will be appended to column titles
     :param ignore_keys: keys to ignore in dicts (these will not be written to
           file)
+    :param progress: progress hook (counts cells), see
+          :func:`.simpleprogress.get_progress`
+    :param atomic: (kwarg only!) - if True, the workbook is saved to a
+          temporary file that replaces filename only once it is complete.
+          ``fsync`` and ``buffering`` kwargs are also accepted, see
+          :func:`.simplefile.get_fileobject`
     :param append_time: (kwarg only!) - append_time - if True,
           :func:`write_dict` will put the header_row as the first row (or, if
           one is not given, generate one, so be aware of this)
@@ -92,7 +117,21 @@ def write_dict(
     row_style or a column_style corresponding to that entry returns
     worksheet created (note can get workbook from worksheet by:
     worksheet.parent)
+
+    If ``lstofdicts`` is a generator (or any other non-indexable iterable)
+    and no styles or workbook are given, it is handed over to
+    :func:`write_dict_stream`. The dicts are still all scanned for keys
+    first (so every column is written, as for a list); pass ``sample_size``
+    to only look at that many and keep memory use constant.
     """
+    if (not hasattr(lstofdicts, '__getitem__') and workbook is None
+            and not any((row_styles, col_styles, style_dict, default_style))):
+        kwargs.setdefault('sample_size', None)
+        return write_dict_stream(lstofdicts, filename=filename,
+                fieldnames=fieldnames, col_titles=col_titles,
+                sheet_name=sheet_name, col_sort_key=col_sort_key,
+                ignore_keys=ignore_keys, progress=progress, **kwargs)
+    file_options = pop_file_options(kwargs)
     ws = get_worksheet(workbook, sheet_name)
     fieldnames, data = dicts_to_list(lstofdicts,
                                             fieldnames=fieldnames, key_sorter=col_sort_key,
@@ -106,18 +145,131 @@ def write_dict(
     settings = dict(data = data,
               row_styles = row_styles or {},
               col_styles = col_styles or {},
-              default_style = default_style or Style(),
+              default_style = default_style,
               use_styles = use_styles,
               style_dict = style_dict or {},
               filename = make_filename(filename, **kwargs),
-              sheet = ws)
+              sheet = ws,
+              progress = progress,
+              label = 'write_dict',
+              file_options = file_options)
     del fieldnames
     _write_spreadsheet(**settings)
     return ws
 
 
 
+def write_only_workbook():
+    """ :returns: a new constant-memory, write-only openpyxl workbook (rows
+    can only be appended and it can only be saved once)"""
+    try:
+        return openpyxl.Workbook(write_only=True)
+    except TypeError:
+        # older openpyxl
+        return openpyxl.Workbook(optimized_write=True)
+
+class _ExactFloat(float):
+    """ float that prints with every digit: openpyxl's write-only workbook
+    writes values with str(), which keeps only 12 on python 2"""
+    __slots__ = ()
+    def __str__(self):
+        return repr(float(self))
+
+def _exact_floats(row):
+    """ row for a write-only sheet, floats wrapped in :class:`_ExactFloat`"""
+    return [_ExactFloat(value) if type(value) is float else value
+            for value in row]
+
+def write_dict_stream(
+        dicts,
+        filename = None,
+        fieldnames = None,
+        col_titles = None,
+        sheet_name = None,
+        col_sort_key = None,
+        ignore_keys = None,
+        sample_size = 1000,
+        extrasaction = 'raise',
+        progress = None,
+        **kwargs):
+    """Constant-memory version of :func:`write_dict` for any iterable of
+    dicts (generators included): rows are appended one at a time to a sheet
+    of a write-only workbook (see :func:`write_only_workbook`), which is then
+    saved to filename. Styles are not supported.
+
+    ``fieldnames``, ``col_titles``, ``col_sort_key`` and ``ignore_keys`` work as
+    for :func:`write_dict`, except that additional fieldnames are only looked
+    for in the first ``sample_size`` dicts (None to read everything into
+    memory first).
+
+    :param extrasaction: what to do with a dict that has keys first seen
+        after the sample (and not in ignore_keys): ``'raise'`` (default)
+        raises ValueError, ``'ignore'`` leaves them out (as
+        :class:`csv.DictWriter`)
+
+    Returns the worksheet written.
+    """
+    if extrasaction not in ('ignore', 'raise'):
+        raise ValueError("extrasaction must be 'ignore' or 'raise', not %r"
+                % extrasaction)
+    file_options = pop_file_options(kwargs)
+    progress = get_progress(progress, 'write_dict_stream')
+    wb = write_only_workbook()
+    if sheet_name is not None:
+        ws = wb.create_sheet(title=sheet_name)
+    else:
+        ws = wb.create_sheet()
+    keys, dicts = sample_keys(dicts, sample_size)
+    fieldnames = merge_fieldnames(keys, fieldnames, key_sorter=col_sort_key,
+            ignore_keys=ignore_keys)
+    header = list(col_titles or [])[:len(fieldnames)]
+    header += map(str, fieldnames[len(header):])
+    ws.append(header)
+    rows = _dict_rows(dicts, fieldnames, ignore_keys, extrasaction)
+    if progress is None:
+        for row in rows:
+            ws.append(row)
+    else:
+        while True:
+            batch = list(islice(rows, progress.batch))
+            if not batch:
+                break
+            for row in batch:
+                ws.append(row)
+            progress.update(len(batch))
+    save_workbook(wb, make_filename(filename, **kwargs), **file_options)
+    if progress is not None:
+        progress.finish()
+    return ws
+
+def _dict_rows(dicts, fieldnames, ignore_keys=None, extrasaction='raise'):
+    """ yields a row of values (ordered by fieldnames, floats exact) for each
+    dict"""
+    if extrasaction == 'raise':
+        known = set(fieldnames).union(ignore_keys or ())
+        for d in dicts:
+            extra = [k for k in d if k not in known]
+            if extra:
+                raise ValueError("dict contains fields not in fieldnames: %r "
+                        "(pass a larger sample_size or extrasaction='ignore')"
+                        % extra)
+            yield _exact_floats([d.get(k) for k in fieldnames])
+    else:
+        for d in dicts:
+            yield _exact_floats([d.get(k) for k in fieldnames])
+
+def _style_fields(style):
+    """ names of the attributes that make up a style"""
+    fields = getattr(style, '__fields__', None)
+    if fields is None:
+        return list(style.__dict__)
+    return fields
+
 def join_styles(default_style, row_style=None, col_style=None):
+    """ :returns: the style for a cell with the given row and column styles.
+    If both are given, a new Style is made from row_style with every part
+    that col_style sets (i.e. that differs from a blank Style) taken from
+    col_style."""
     if not(row_style or col_style):
         return default_style
     if row_style is None:
@@ -126,45 +278,282 @@ def join_styles(default_style, row_style=None, col_style=None):
         return row_style
     else:
         style = Style()
-        style.__dict__.update(row_style)
-        style.__dict__.update(col_style)
+        blank = Style()
+        for name in _style_fields(style):
+            value = getattr(col_style, name)
+            if repr(value) == repr(getattr(blank, name)):
+                value = getattr(row_style, name)
+            setattr(style, name, value)
         return style
 
+class StyleCache(object):
+    """ memoizes :func:`join_styles` for one default style, so each distinct
+    (row_style, col_style) combination is only built once and is shared by
+    every cell that uses it. Styles are keyed by identity."""
+    def __init__(self, default_style=None):
+        self.default_style = default_style
+        self._joined = {}
+
+    def __call__(self, row_style=None, col_style=None):
+        key = (id(row_style), id(col_style))
+        try:
+            return self._joined[key][2]
+        except KeyError:
+            style = join_styles(self.default_style, row_style, col_style)
+            # keep row/col styles alive so their ids stay unique
+            self._joined[key] = (row_style, col_style, style)
+            return style
+
+    def __len__(self):
+        return len(self._joined)
+
+_RANGE_RE = re.compile(
+        r'^\$?([A-Za-z]*)\$?(\d*)(?::\$?([A-Za-z]*)\$?(\d*))?$')
+
+_COLUMN_RE = re.compile(r'^[A-Z]{1,3}$')
+
+def _column_index(letters):
+    """ 'A' -> 0, 'AB' -> 27"""
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def cell_range(key, nrows, ncols):
+    """ converts a style_dict key to (first row, first col, last row + 1,
+    last col + 1), 0-based, clipped to nrows x ncols. key is a position
+    tuple ((0, 1)), a cell name ('B1'), a range ('A1:D100'), columns ('B:D')
+    or rows ('2:10')."""
+    if isinstance(key, tuple):
+        i, j = key
+        return i, j, i + 1, j + 1
+    match = _RANGE_RE.match(key)
+    if match is None or not any(match.groups()):
+        raise ValueError("not a cell or range: %r" % (key,))
+    col0, row0, col1, row1 = match.groups()
+    if match.group(0).count(':') == 0:
+        col1, row1 = col0, row0
+    r0 = int(row0) - 1 if row0 else 0
+    r1 = int(row1) if row1 else nrows
+    c0 = _column_index(col0) if col0 else 0
+    c1 = _column_index(col1) + 1 if col1 else ncols
+    return r0, c0, min(r1, nrows), min(c1, ncols)
+
+def _set_style(sheet, i, j, style):
+    cell = sheet.cell(row=i, column=j)
+    try:
+        cell.style = style
+    except AttributeError:
+        # openpyxl 1.x keeps styles on the worksheet, by coordinate
+        sheet._styles[cell.get_coordinate()] = style
+
+def _apply_styles(sheet, nrows, ncols, row_styles, col_styles, style_dict,
+        default_style, progress=None, set_style=None):
+    """ styles a sheet of nrows x ncols cells. Only cells covered by a row,
+    column or style_dict rule (or every cell if there's a default_style) are
+    visited, and combined styles come from a :class:`StyleCache`. Styles are
+    set with set_style(i, j, style) if given (later calls win)."""
+    if set_style is None:
+        set_style = lambda i, j, style: _set_style(sheet, i, j, style)
+    joined = StyleCache(default_style)
+    row_styles = dict((i, style) for i, style in row_styles.items()
+                      if 0 <= i < nrows and style is not None)
+    col_styles = dict((j, style) for j, style in col_styles.items()
+                      if 0 <= j < ncols and style is not None)
+    # whole styled rows (merged with column styles)
+    for i, row_style in row_styles.items():
+        for j in range(ncols):
+            set_style(i, j, joined(row_style, col_styles.get(j)))
+        if progress is not None:
+            progress.update(ncols)
+    # styled columns, outside the styled rows
+    other_rows = [i for i in range(nrows) if i not in row_styles]
+    for j, col_style in col_styles.items():
+        for i in other_rows:
+            set_style(i, j, col_style)
+        if progress is not None:
+            progress.update(len(other_rows))
+    # everything else gets the default
+    if default_style is not None:
+        other_cols = [j for j in range(ncols) if j not in col_styles]
+        for i in other_rows:
+            for j in other_cols:
+                set_style(i, j, default_style)
+        if progress is not None:
+            progress.update(len(other_rows) * len(other_cols))
+    # cells and ranges from style_dict win
+    for key, style in style_dict.items():
+        r0, c0, r1, c1 = cell_range(key, nrows, ncols)
+        for i in range(r0, r1):
+            for j in range(c0, c1):
+                set_style(i, j, style)
+        if progress is not None:
+            progress.update(max(r1 - r0, 0) * max(c1 - c0, 0))
+    return joined
+
 def _write_spreadsheet(sheet, data, row_styles, col_styles,
-        style_dict, filename, default_style, use_styles, **kwargs):
+        style_dict, filename, default_style, use_styles, progress=None,
+        label='_write_spreadsheet', file_options=None, **kwargs):
     """ helper function for writing spreadsheets, better to call typed
     functions directly. Additionally, best to call this function with keyword
     arguments, so no worries about ordering, etc). Will fail if any parameter
-    given is None"""
-    ctr = 0
-    print "Storing values",
+    given is None (except progress and default_style). label is the name
+    progress is reported under (the public caller's)"""
+    progress = get_progress(progress, label, unit='cells')
+    ncols = 0
     for i, row in enumerate(data):
         for j, cell in enumerate(row):
-            ctr += 1
-            print ".",
-            sheet[(i,j)].value = cell
-    print("Successfully stored {} cells".format(ctr))
+            sheet.cell(row=i, column=j).value = cell
+        ncols = max(ncols, len(row))
+        if progress is not None:
+            progress.update(len(row))
     if use_styles:
-        print "\nStoring styles",
         if not(isinstance(row_styles, Mapping)):
-            row_styles = list_to_dicts(row_styles)
+            row_styles = list_to_dict(row_styles)
         if not(isinstance(col_styles, Mapping)):
-            col_styles = list_to_dicts(col_styles)
-        join_styles = lambda row, col: join_styles(default_style, row_style=row,
-                col_style=col)
-        ctr = 0
-        for i in range(len(data)):
-            for j in range(len(row)):
-                ctr += 1
-                print ".",
-                sheet[(i,j)].style = (style_dict.get((i,j))
-                                      or join_styles(row_styles.get(i),
-                                                    col_styles.get(j)))
-        print("Successfully stored style in {} cells".format(ctr))
+            col_styles = list_to_dict(col_styles)
+        _apply_styles(sheet, len(data), ncols, row_styles, col_styles,
+                style_dict, default_style, progress)
     print("Saving workbook.")
-    sheet.parent.save(filename)
+    save_workbook(sheet.parent, filename, **(file_options or {}))
+    if progress is not None:
+        progress.finish()
+
+# write_dict keywords that can be given per sheet to write_workbook
+SHEET_OPTIONS = ('fieldnames', 'col_titles', 'row_styles', 'col_styles',
+        'style_dict', 'col_sort_key', 'ignore_keys', 'default_style')
+
+def write_workbook(
+        sheets,
+        filename = None,
+        sheet_options = None,
+        processes = None,
+        progress = None,
+        **kwargs):
+    """Writes several sheets to one workbook, which is saved only once at the
+    end (unlike calling :func:`write_dict` per sheet with a shared workbook,
+    which saves it every time).
+
+    The slow, pure-python part of each sheet - finding fieldnames,
+    :func:`.simpledict.dicts_to_list` and working out the style of every
+    cell - runs in a :class:`multiprocessing.Pool`; the results are then put
+    into the workbook in sheet order.
+
+    :param sheets: mapping (ordered, if sheet order matters) of sheet name
+        -> list of dicts
+    :param sheet_options: mapping of sheet name -> dict of :func:`write_dict`
+        keywords for that sheet (see :data:`SHEET_OPTIONS`). Everything in it
+        (e.g. col_sort_key, styles) must be picklable.
+    :param processes: size of the pool, default
+        :func:`multiprocessing.cpu_count`. With 1 (or 0) sheets are prepared
+        in this process.
+    :param progress: progress hook (counts cells), see
+        :func:`.simpleprogress.get_progress`
+    :param atomic: (kwarg only!) - as for :func:`write_dict`, also ``fsync``
+        and ``buffering``
+
+    Returns the workbook written.
+    """
+    file_options = pop_file_options(kwargs)
+    sheet_options = sheet_options or {}
+    tasks = []
+    for name, lstofdicts in sheets.items():
+        options = dict(sheet_options.get(name) or {})
+        unknown = set(options).difference(SHEET_OPTIONS)
+        if unknown:
+            raise TypeError("unsupported sheet options for %r: %r" % (name,
+                sorted(unknown)))
+        if not hasattr(lstofdicts, '__getitem__'):
+            lstofdicts = list(lstofdicts)
+        tasks.append((name, lstofdicts, options))
+    progress = get_progress(progress, 'write_workbook', unit='cells')
+    wb = openpyxl.Workbook()
+    # fill the default sheet first, create the rest in order
+    ws = wb.get_active_sheet()
+    sheet_list = []
+    for name, lstofdicts, options in tasks:
+        if ws is None:
+            ws = wb.create_sheet()
+        ws.title = name
+        sheet_list.append(ws)
+        ws = None
+    processes = (multiprocessing.cpu_count() if processes is None
+            else processes)
+    if processes > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        try:
+            results = pool.imap(_prepare_sheet, tasks)
+            _fill_sheets(sheet_list, results, progress)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        _fill_sheets(sheet_list, (_prepare_sheet(task) for task in tasks),
+                progress)
+    save_workbook(wb, make_filename(filename, **kwargs), **file_options)
+    if progress is not None:
+        progress.finish()
+    return wb
+
+def _prepare_sheet(task):
+    """ worker for :func:`write_workbook`: returns (rows, cell styles) for
+    one sheet, where rows starts with the header and cell styles is a list
+    of (row, column, style)"""
+    name, lstofdicts, options = task
+    fieldnames, data = dicts_to_list(lstofdicts,
+            fieldnames=options.get('fieldnames'),
+            key_sorter=options.get('col_sort_key'),
+            ignore_keys=options.get('ignore_keys'))
+    header = list(options.get('col_titles') or [])[:len(fieldnames)]
+    header += map(str, fieldnames[len(header):])
+    data = [header] + data
+    cell_styles = {}
+    row_styles = options.get('row_styles') or {}
+    col_styles = options.get('col_styles') or {}
+    style_dict = options.get('style_dict') or {}
+    default_style = options.get('default_style')
+    if any((row_styles, col_styles, style_dict, default_style)):
+        if not(isinstance(row_styles, Mapping)):
+            row_styles = list_to_dict(row_styles)
+        if not(isinstance(col_styles, Mapping)):
+            col_styles = list_to_dict(col_styles)
+        def set_style(i, j, style):
+            cell_styles[i, j] = style
+        _apply_styles(None, len(data), len(header), row_styles, col_styles,
+                style_dict, default_style, set_style=set_style)
+    return data, [(i, j, style) for (i, j), style in cell_styles.items()]
+
+def _fill_sheets(sheets, results, progress=None):
+    """ puts the results of :func:`_prepare_sheet` into sheets"""
+    for sheet, (data, cell_styles) in zip(sheets, results):
+        for i, row in enumerate(data):
+            for j, value in enumerate(row):
+                sheet.cell(row=i, column=j).value = value
+            if progress is not None:
+                progress.update(len(row))
+        for i, j, style in cell_styles:
+            _set_style(sheet, i, j, style)
+
+def save_workbook(workbook, filename, atomic=False, fsync=False,
+        buffering=-1, **kwargs):
+    """ saves workbook to filename. If atomic, it is written to a temporary
+    file first and only moved to filename once complete (fsync and buffering
+    as for :func:`.simplefile.get_fileobject`)."""
+    if not atomic and buffering == -1:
+        workbook.save(filename)
+        return
+    f = get_fileobject(filename, mode='wb', compression=None,
+            buffering=buffering, atomic=atomic, fsync=fsync)
+    try:
+        workbook.save(f)
+    except:
+        discard_fileobject(f)
+        raise
+    f.close()
 
-def basic_read_sheet(filename=None, workbook=None, sheet_name='', preserve_styles=False):
+def basic_read_sheet(filename=None, workbook=None, sheet_name='',
+        preserve_styles=False, progress=None):
     """ reads a sheet from a workbook or file (workbook can either be a
     workbook or worksheet).
 
@@ -172,6 +561,8 @@ def basic_read_sheet(filename=None, workbook=None, sheet_name='', preserve_style
 
         This is still really rough, so be careful when using.
 
+    :param progress: progress hook (counts rows), see
+        :func:`.simpleprogress.get_progress`
     """
     #TODO: make this use get_fileobject for filename
     if (filename is None and workbook is None) or (filename and workbook):
@@ -194,6 +585,348 @@ def basic_read_sheet(filename=None, workbook=None, sheet_name='', preserve_style
         style_dict.update(dict((cell.get_coordinate(), cell.style) for row in
                 ws.rows for cell in row
                 if cell is not None and cell.style != default_style))
-    output = [[cell.value for cell in row] for row in ws.rows]
+    progress = get_progress(progress, 'basic_read_sheet')
+    if progress is None:
+        output = [[cell.value for cell in row] for row in ws.rows]
+    else:
+        output = []
+        for row in ws.rows:
+            output.append([cell.value for cell in row])
+            progress.update(1)
+        progress.finish()
     #TODO: somehow check to see if first row are titles or not
     return output, style_dict
+
+def read_only_workbook(filename):
+    """ :returns: the workbook at filename opened in openpyxl's streaming,
+    read-only mode (rows can only be iterated over)"""
+    try:
+        return openpyxl.load_workbook(filename, read_only=True)
+    except TypeError:
+        # older openpyxl
+        return openpyxl.load_workbook(filename, use_iterators=True)
+
+def _get_sheet(wb, sheet_name=None):
+    return ((sheet_name and wb.get_sheet_by_name(sheet_name))
+            or wb.get_active_sheet())
+
+def _iter_range(ws, min_row=None, max_row=None):
+    """ rows min_row to max_row (1-based, inclusive) of a read-only sheet,
+    every column"""
+    try:
+        return ws.iter_rows(min_row=min_row, max_row=max_row)
+    except TypeError:
+        # older openpyxl only takes range strings, whose last column it
+        # leaves out, so filter the full rows by row number instead
+        rows = ws.iter_rows()
+        if min_row is not None:
+            rows = dropwhile(lambda row: row and row[0].row < min_row, rows)
+        if max_row is not None:
+            rows = takewhile(lambda row: not row or row[0].row <= max_row,
+                    rows)
+        return rows
+
+def iter_sheet(
+        filename,
+        sheet_name=None,
+        header=None,
+        as_dicts=False,
+        min_row=None,
+        max_row=None,
+        usecols=None,
+        progress=None):
+    """ streams the rows of a sheet in filename (using openpyxl's read-only
+    mode, so the workbook is never loaded into memory) as tuples of cell
+    values, or as dicts if as_dicts.
+
+    :param sheet_name: sheet to read, default the active one
+    :param header: row number (1-based, as in Excel) of the column titles.
+        Defaults to the first row when as_dicts or usecols names columns.
+        The header row itself is yielded first unless as_dicts.
+    :param min_row: first row to yield (1-based), default the row after the
+        header (or the first)
+    :param max_row: last row to yield, default the last in the sheet
+    :param usecols: columns to keep: titles, letters ('C', matched against
+        titles first if there's a header) or 0-based indexes
+    :param progress: progress hook (counts rows), see
+        :func:`.simpleprogress.get_progress`
+
+    Use :func:`read_styles` to get the styles of a range of cells.
+    """
+    wb = read_only_workbook(filename)
+    ws = _get_sheet(wb, sheet_name)
+    by_name = usecols is not None and any(isinstance(col, basestring)
+            and not _COLUMN_RE.match(col) for col in usecols)
+    if header is None and (as_dicts or by_name):
+        header = 1
+    titles = None
+    if header is not None:
+        titles = _values(next(iter(_iter_range(ws, header, header)), ()))
+        if min_row is None:
+            min_row = header + 1
+    progress = get_progress(progress, 'iter_sheet')
+    rows = (_values(row) for row in _iter_range(ws, min_row, max_row))
+    select = None
+    if usecols is not None:
+        indices = []
+        for col in usecols:
+            if isinstance(col, (int, long)):
+                indices.append(col)
+            elif titles is not None and col in titles:
+                indices.append(titles.index(col))
+            else:
+                indices.append(_column_index(col))
+        select = sc._selector(indices)
+        if titles is not None:
+            titles = tuple(select(_padded(titles, indices)))
+        rows = (tuple(select(_padded(row, indices))) for row in rows)
+    if as_dicts:
+        rows = (dict(zip(titles, row)) for row in rows)
+    elif titles is not None:
+        rows = chain([titles], rows)
+    if progress is not None:
+        rows = _report(rows, progress)
+    return rows
+
+def _values(row):
+    """ cell values of a row from a read-only sheet"""
+    return tuple(cell.value if hasattr(cell, 'value') else cell.internal_value
+                 for cell in row)
+
+def _padded(row, indices):
+    """ row, extended with None so all indices are valid"""
+    width = max(indices) + 1
+    if len(row) < width:
+        return tuple(row) + (None,) * (width - len(row))
+    return row
+
+def _report(rows, progress):
+    for batch in sc._batches(rows, progress.batch):
+        progress.update(len(batch))
+        for row in batch:
+            yield row
+    progress.finish()
+
+def read_styles(filename, cells, sheet_name=None):
+    """ reads the styles of just the given cells (any :func:`cell_range`
+    key, e.g. 'A1:D10' or 'B:C'), streaming the sheet as :func:`iter_sheet`
+    does, and returns a dict in the format of :func:`basic_read_sheet`'s style_dict: coordinate -> style
+    for every cell whose style isn't the default, plus ``"default"``."""
+    wb = read_only_workbook(filename)
+    ws = _get_sheet(wb, sheet_name)
+    default_style = Style()
+    style_dict = {"default": default_style}
+    table = None
+    r0, c0, r1, c1 = cell_range(cells, sys.maxint, sys.maxint)
+    for row in _iter_range(ws, r0 + 1, r1 if r1 != sys.maxint else None):
+        for cell in row[c0:c1]:
+            style = getattr(cell, 'style', None)
+            if style is None and getattr(cell, 'style_id', None) is not None:
+                # openpyxl 1.x read-only cells only have an index into the
+                # workbook's style table
+                if table is None:
+                    table = _style_table(filename)
+                style = table.get(int(cell.style_id))
+            if style is not None and repr(style) != repr(default_style):
+                style_dict[cell.coordinate] = style
+    return style_dict
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# <font> flag elements -> Font attributes
+_FONT_FLAGS = {'b': 'bold', 'i': 'italic', 'strike': 'strikethrough'}
+
+def _style_table(filename):
+    """ index -> Style for the cell styles of the workbook at filename"""
+    from openpyxl.reader.style import read_style_table
+    archive = ZipFile(filename, 'r')
+    try:
+        xml = archive.read('xl/styles.xml')
+    finally:
+        archive.close()
+    table = read_style_table(xml)
+    # openpyxl 1.x only reads number formats back, add fonts and fills
+    root = ElementTree.fromstring(xml)
+    fonts = root.findall('%sfonts/%sfont' % (_SHEET_NS, _SHEET_NS))
+    fills = root.findall('%sfills/%sfill' % (_SHEET_NS, _SHEET_NS))
+    xfs = root.findall('%scellXfs/%sxf' % (_SHEET_NS, _SHEET_NS))
+    for index, xf in enumerate(xfs):
+        style = table.get(index)
+        if style is None:
+            continue
+        font_id = int(xf.get('fontId', 0))
+        # the first font and the first two fills are the defaults
+        if 0 < font_id < len(fonts):
+            _read_font(style.font, fonts[font_id])
+        fill_id = int(xf.get('fillId', 0))
+        if 1 < fill_id < len(fills):
+            _read_fill(style.fill, fills[fill_id])
+    return table
+
+def _read_font(font, node):
+    """ sets the attributes of font from a <font> element"""
+    for child in node:
+        tag = child.tag.replace(_SHEET_NS, '')
+        value = child.get('val')
+        if tag == 'name':
+            font.name = value
+        elif tag == 'sz':
+            size = float(value)
+            font.size = int(size) if size.is_integer() else size
+        elif tag in _FONT_FLAGS:
+            # <b/> is on, <b val="0"/> off
+            setattr(font, _FONT_FLAGS[tag], value not in ('0', 'false'))
+        elif tag == 'u':
+            font.underline = value or font.UNDERLINE_SINGLE
+        elif tag == 'color' and child.get('rgb'):
+            font.color.index = child.get('rgb')
+
+def _read_fill(fill, node):
+    """ sets the attributes of fill from a <fill> element"""
+    pattern = node.find(_SHEET_NS + 'patternFill')
+    if pattern is None:
+        return
+    fill.fill_type = pattern.get('patternType', fill.fill_type)
+    for tag, attr in (('fgColor', 'start_color'), ('bgColor', 'end_color')):
+        color = pattern.find(_SHEET_NS + tag)
+        if color is not None and color.get('rgb'):
+            getattr(fill, attr).index = color.get('rgb')
+
+def csv_to_xlsx(
+        csvfile,
+        filename = None,
+        sheet_name = None,
+        types = True,
+        schema = None,
+        encoding = 'utf-8',
+        errors = None,
+        progress = None,
+        **kwargs):
+    """ streams the csv at csvfile (path or fileobject) into a sheet of a
+    new, write-only workbook (see :func:`write_only_workbook`) saved to
+    filename, one row at a time, so memory use doesn't grow with the file.
+
+    :param types: if True, numbers, bools and dates are written as such
+        (with :func:`.simplecsv.iter_typed`; a schema is inferred from the
+        first rows unless one is given) instead of as text
+    :param schema: schema for :func:`.simplecsv.iter_typed`
+    :param encoding: encoding of the csv
+    :param errors: list that collects values that couldn't be converted
+        (see :func:`.simplecsv.iter_typed`)
+    :param progress: progress hook (counts rows, see rows/s in
+        :func:`.simpleprogress.print_progress`), see
+        :func:`.simpleprogress.get_progress`
+
+    Other keywords (dialect, delimiter, ...) are passed to the csv reader;
+    ``compression`` applies to csvfile and ``atomic``, ``fsync`` and
+    ``buffering`` to filename. Returns filename.
+    """
+    file_options = pop_file_options(kwargs)
+    for option in ('compression', 'compresslevel'):
+        if option in file_options:
+            kwargs[option] = file_options.pop(option)
+    progress = get_progress(progress, 'csv_to_xlsx')
+    if types:
+        rows = sc.iter_typed(csvfile, schema=schema, encoding=encoding,
+                errors=errors, **kwargs)
+    else:
+        rows = sc.iter_lists(csvfile, encoding=encoding, **kwargs)
+    wb = write_only_workbook()
+    if sheet_name is not None:
+        ws = wb.create_sheet(title=sheet_name)
+    else:
+        ws = wb.create_sheet()
+    for batch in sc._batches(rows, progress.batch if progress else 1000):
+        for row in batch:
+            ws.append(_exact_floats(row))
+        if progress is not None:
+            progress.update(len(batch))
+    filename = make_filename(filename)
+    save_workbook(wb, filename, **file_options)
+    if progress is not None:
+        progress.finish(_size(filename))
+    return filename
+
+def xlsx_to_csv(
+        filename,
+        csvfile = None,
+        sheet_name = None,
+        types = True,
+        encoding = 'utf-8',
+        dialect = 'excel',
+        progress = None,
+        **kwargs):
+    """ streams a sheet of the workbook at filename (read with
+    :func:`iter_sheet`, so it is never loaded into memory) to the csv at
+    csvfile (path or fileobject, default a new file named by
+    :func:`~.simpletime.pretty_time`).
+
+    :param types: if True, values are written so they read back as the same
+        type with :func:`.simplecsv.read_typed`: whole numbers without
+        '.0', dates (and datetimes at midnight) as YYYY-MM-DD and other
+        datetimes in ISO format to the second. Otherwise values are written
+        as ``str`` would.
+    :param encoding: encoding for text in the csv
+    :param progress: progress hook (counts rows), see
+        :func:`.simpleprogress.get_progress`
+
+    ``min_row``, ``max_row`` and ``usecols`` are passed to
+    :func:`iter_sheet`, other keywords (delimiter, quoting, ...) to
+    :class:`csv.writer` and file options (``compression``, ``atomic``, ...)
+    to :func:`.simplefile.get_fileobject`. Returns csvfile.
+    """
+    sheet_options = dict((k, kwargs.pop(k)) for k in
+            ('min_row', 'max_row', 'usecols') if k in kwargs)
+    progress = get_progress(progress, 'xlsx_to_csv')
+    rows = iter_sheet(filename, sheet_name, **sheet_options)
+    to_text = _typed_text if types else _text
+    f = get_fileobject(csvfile, mode='wb', ext='.csv',
+            **pop_file_options(kwargs))
+    try:
+        writer = csv.writer(f, dialect=dialect, **kwargs)
+        for batch in sc._batches(rows, progress.batch if progress else 1000):
+            writer.writerows([[to_text(value, encoding) for value in row]
+                              for row in batch])
+            if progress is not None:
+                progress.update(len(batch), tell(f))
+        if progress is not None:
+            progress.finish(tell(f))
+    except:
+        discard_fileobject(f)
+        raise
+    f.close()
+    return csvfile
+
+def _text(value, encoding):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode(encoding)
+    if isinstance(value, float):
+        # str() keeps only 12 digits on python 2
+        return repr(value)
+    return str(value)
+
+def _typed_text(value, encoding):
+    """ value as text that :mod:`~.simpletypes` reads back as the same
+    type"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        # excel stores times as fractions of a day, round off the noise
+        value = value.replace(microsecond=0) + datetime.timedelta(
+                seconds=value.microsecond >= 500000)
+        if value.time() == datetime.time():
+            return value.date().isoformat()
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return _text(value, encoding)
+
+def _size(filename):
+    try:
+        return os.path.getsize(filename)
+    except (OSError, TypeError):
+        return None
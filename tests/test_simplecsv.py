@@ -0,0 +1,281 @@
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+
+import nose.tools as nt
+from simpleutils import simplecsv as sc
+from simpleutils.simpledict import RecordTable
+
+CSV_TEXT = 'a,b,c\r\n1,2,3\r\n4,"five\r\nlines",6\r\n'
+
+_tmpdir = None
+
+def setup():
+    global _tmpdir
+    _tmpdir = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(_tmpdir)
+
+def make_csv(text=CSV_TEXT, name='test.csv'):
+    path = os.path.join(_tmpdir, name)
+    with open(path, 'wb') as f:
+        f.write(text)
+    return path
+
+def test_iter_lists_matches_read_to_list():
+    path = make_csv()
+    nt.assert_equal(list(sc.iter_lists(path)), sc.read_to_list(path))
+    nt.assert_equal(sc.read_to_list(path)[2], ['4', 'five\r\nlines', '6'])
+
+def test_iter_dicts_matches_read_to_dict():
+    path = make_csv()
+    nt.assert_equal(list(sc.iter_dicts(path)), sc.read_to_dict(path))
+    nt.assert_equal(sc.read_to_dict(path)[0], {'a': '1', 'b': '2', 'c': '3'})
+
+def test_iter_lists_is_lazy_and_closes_file():
+    f = StringIO(CSV_TEXT)
+    rows = sc.iter_lists(f)
+    nt.assert_equal(next(rows), ['a', 'b', 'c'])
+    nt.assert_false(f.closed)
+    rows.close()
+    nt.assert_true(f.closed)
+
+def test_iter_lists_decodes():
+    path = make_csv('x\r\ncaf\xc3\xa9\r\n')
+    nt.assert_equal(list(sc.iter_lists(path, encoding='utf-8')),
+            [[u'x'], [u'caf\xe9']])
+
+ROWS = [{'b': 1, 'a': 2}, {'a': 3}, {'c': 'x', 'a': 4}]
+
+def check_write_dict_stream(schema, fieldnames, expected):
+    path = os.path.join(_tmpdir, 'out.csv')
+    sc.write_dict_stream(iter(ROWS), path, fieldnames=fieldnames,
+            schema=schema, batch_size=2)
+    nt.assert_equal(sc.read_to_list(path), expected)
+
+def test_write_dict_stream():
+    everything = [['a', 'b', 'c'], ['2', '1', ''], ['3', '', ''], ['4', '', 'x']]
+    yield check_write_dict_stream, 'spill', None, everything
+    yield check_write_dict_stream, 'sample', None, everything
+    yield (check_write_dict_stream, None, ['c', 'a'],
+            [['c', 'a'], ['', '2'], ['', '3'], ['x', '4']])
+
+def test_write_dict_stream_keeps_types():
+    import csv
+    rows = [{'a': 1, 'b': 'x'}, {'a': 2.5, 'c': 'y'}]
+    path = os.path.join(_tmpdir, 'nonnumeric.csv')
+    sc.write_dict(rows, path, quoting=csv.QUOTE_NONNUMERIC)
+    expected = open(path, 'rb').read()
+    nt.assert_equal(expected.splitlines()[1], '1,"x",""')
+    for schema in ('spill', 'sample'):
+        sc.write_dict_stream(iter(rows), path, schema=schema, batch_size=1,
+                quoting=csv.QUOTE_NONNUMERIC)
+        nt.assert_equal(open(path, 'rb').read(), expected)
+
+def test_write_dict_stream_sample_size():
+    path = os.path.join(_tmpdir, 'sample.csv')
+    sc.write_dict_stream(iter(ROWS), path, schema='sample', sample_size=1)
+    nt.assert_equal(sc.read_to_list(path)[0], ['a', 'b'])
+
+@nt.raises(ValueError)
+def test_write_dict_stream_extrasaction():
+    sc.write_dict_stream(ROWS, StringIO(), fieldnames=['a'],
+            extrasaction='raise')
+
+def test_progress_callback():
+    seen = []
+    path = os.path.join(_tmpdir, 'progress.csv')
+    sc.write_list([['a']] + [[i] for i in range(10)], path,
+            progress=seen.append)
+    nt.assert_true(seen[-1].done)
+    nt.assert_equal(seen[-1].count, 10)
+    nt.assert_equal(seen[-1].nbytes, os.path.getsize(path))
+    del seen[:]
+    nt.assert_equal(len(sc.read_to_list(path, progress=seen.append)), 11)
+    nt.assert_equal((seen[-1].label, seen[-1].count), ('read_to_list', 11))
+
+def test_chunk_boundaries_respect_quotes():
+    text = 'a,b\n"x\n""y""\nz",1\n2,3\n"\n",4\n'
+    f = StringIO(text)
+    for chunk_size in range(1, len(text) + 2):
+        for blocksize in (1, 3, 64):
+            bounds = sc._chunk_boundaries(f, chunk_size, '"', blocksize)
+            nt.assert_equal(bounds[0], 0)
+            nt.assert_equal(bounds[-1], len(text))
+            nt.assert_true(set(bounds) <= set([0, 4, 18, 22, len(text)]))
+
+def test_read_to_list_parallel():
+    text = 'a,b\r\n' + ''.join('%d,"line\r\n%d"\r\n' % (i, i) for i in range(500))
+    path = make_csv(text, 'parallel.csv')
+    expected = sc.read_to_list(path)
+    nt.assert_equal(sc.read_to_list_parallel(path, processes=2,
+        chunk_size=100), expected)
+    unordered = list(sc.iter_lists_parallel(path, processes=2,
+        chunk_size=100, ordered=False))
+    nt.assert_equal(sorted(unordered), sorted(expected))
+
+def test_read_to_list_parallel_single_chunk():
+    path = make_csv(CSV_TEXT, 'single.csv')
+    pool = sc.multiprocessing.Pool
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a pool was started")
+    sc.multiprocessing.Pool = no_pool
+    try:
+        # one process, and a file smaller than the default chunk size
+        nt.assert_equal(sc.read_to_list_parallel(path, processes=1,
+            chunk_size=1), sc.read_to_list(path))
+        nt.assert_equal(sc.read_to_list_parallel(path, processes=4),
+                sc.read_to_list(path))
+    finally:
+        sc.multiprocessing.Pool = pool
+
+def test_mapped_csv():
+    text = 'a,b\r\n' + ''.join('%d,"x\r\n%d"\r\n' % (i, i) for i in range(50))
+    path = make_csv(text, 'mapped.csv')
+    expected = sc.read_to_list(path)
+    for attempt in range(2):
+        # second time round the saved index is used
+        with sc.MappedCSV(path) as rows:
+            nt.assert_equal(len(rows), len(expected))
+            nt.assert_equal(rows[0], expected[0])
+            nt.assert_equal(rows[-1], expected[-1])
+            nt.assert_equal(rows[10:20], expected[10:20])
+            nt.assert_equal(rows[::7], expected[::7])
+            nt.assert_equal(list(rows), expected)
+            nt.assert_equal(str(rows.raw(1)), '0,"x\r\n0"\r\n')
+        nt.assert_true(os.path.exists(path + '.idx'))
+
+def test_mapped_csv_stale_index():
+    path = make_csv('a\r\n1\r\n', 'stale.csv')
+    nt.assert_equal(len(sc.MappedCSV(path)), 2)
+    with open(path, 'ab') as f:
+        f.write('2\r\n3')
+    nt.assert_equal(sc.MappedCSV(path)[1:], [['1'], ['2'], ['3']])
+
+def test_read_typed():
+    import datetime
+    path = make_csv('i,f,b,d,s,n\r\n1,1.5,true,2012-08-09,x,\r\n'
+            '2,2,no,2012-08-10,y,3\r\n', 'typed.csv')
+    rows = sc.read_typed(path)
+    nt.assert_equal(rows, [['i', 'f', 'b', 'd', 's', 'n'],
+        [1, 1.5, True, datetime.date(2012, 8, 9), 'x', None],
+        [2, 2.0, False, datetime.date(2012, 8, 10), 'y', 3]])
+    nt.assert_equal(sc.read_typed(path, as_dicts=True)[1]['n'], 3)
+
+def test_read_typed_errors():
+    path = make_csv('a,b\r\n1,x\r\nz,y\r\n3\r\n', 'typed_errors.csv')
+    errors = []
+    rows = sc.read_typed(path, schema={'a': 'int'}, errors=errors,
+            encoding='utf-8')
+    nt.assert_equal(rows[1:], [[1, u'x'], [None, u'y'], [3, None]])
+    nt.assert_equal([(e.row, e.column, e.name, e.value) for e in errors],
+            [(2, 0, u'a', 'z'), (3, 1, u'b', None)])
+
+def test_blank_lines_are_not_converted():
+    from array import array
+    path = make_csv('a,b\r\n1,x\r\n\r\n2,y\r\n', 'blank.csv')
+    errors = []
+    nt.assert_equal(sc.read_typed(path, errors=errors),
+            [['a', 'b'], [1, 'x'], [], [2, 'y']])
+    nt.assert_equal(errors, [])
+    columns = sc.read_columns(path, use_numpy=False, errors=errors)
+    nt.assert_equal(columns['a'], array('l', [1, 2]))
+    nt.assert_equal(columns['b'], ['x', 'y'])
+    nt.assert_equal(errors, [])
+
+def test_read_columns():
+    from array import array
+    path = make_csv('a,b,c,d\r\n1,x,1.5,\r\n2,x,,7\r\n3,y,2\r\n', 'columns.csv')
+    columns = sc.read_columns(path, use_numpy=False)
+    nt.assert_equal(columns.keys(), ['a', 'b', 'c', 'd'])
+    nt.assert_equal(columns['a'], array('l', [1, 2, 3]))
+    nt.assert_equal(columns['b'], ['x', 'x', 'y'])
+    nt.assert_true(columns['b'][0] is columns['b'][1])
+    nt.assert_equal(columns['c'][::2], array('d', [1.5, 2.0]))
+    nt.assert_true(columns['c'][1] != columns['c'][1])   # NaN
+    nt.assert_equal(columns['d'], [None, 7, None])
+    only = sc.read_columns(path, usecols=['c', 'a'], schema={'a': 'str'},
+            use_numpy=False)
+    nt.assert_equal(only.keys(), ['a', 'c'])
+    nt.assert_equal(only['a'], ['1', '2', '3'])
+    # a header alone still gives every column
+    empty = sc.read_columns(make_csv('a,b\r\n', 'header.csv'),
+            use_numpy=False)
+    nt.assert_equal(empty.items(), [('a', []), ('b', [])])
+    nt.assert_raises(ValueError, sc.read_columns, path, schema=['int'])
+
+def test_read_to_dict_pushdown():
+    path = make_csv('a,b,c\r\n1,x,p\r\n2,y,q\r\n\r\n10,z\r\n', 'pushdown.csv')
+    everything = sc.read_to_dict(path)
+    nt.assert_equal(sc.read_to_dict(path, usecols=['c', 'a']),
+            [dict((k, d[k]) for k in 'ac') for d in everything])
+    nt.assert_equal(sc.read_to_dict(path, where=('a', '>', 1),
+        usecols=['b']), [{'b': 'y'}, {'b': 'z'}])
+    # compared as strings, '10' < '2'
+    nt.assert_equal(sc.read_to_dict(path, where=[('a', '<', '2'),
+        ('b', 'in', 'xz')]), [everything[0], everything[2]])
+    nt.assert_equal(sc.read_to_dict(path, where=lambda row: row[1] == 'y'),
+            [everything[1]])
+    # numeric tests on fields a short row doesn't have reject it
+    nt.assert_equal(sc.read_to_dict(path, where=('c', '>', 1)), [])
+    short = make_csv('a,b\r\n1,2\r\n3\r\n', 'short.csv')
+    nt.assert_equal(sc.read_to_dict(short, where=('b', '>', 1)),
+            [{'a': '1', 'b': '2'}])
+
+def check_compressed_roundtrip(ext, magic):
+    path = os.path.join(_tmpdir, 'compressed.csv' + ext)
+    rows = [['a', 'b']] + [[str(i), 'x' * i] for i in range(100)]
+    sc.write_list(list(rows), path, compresslevel=1)
+    with open(path, 'rb') as f:
+        nt.assert_true(f.read(len(magic)) == magic)
+    nt.assert_equal(sc.read_to_list(path), rows)
+    nt.assert_equal(len(sc.read_to_dict(path, usecols=['b'])), 100)
+
+def test_compressed_roundtrip():
+    yield check_compressed_roundtrip, '.gz', '\x1f\x8b'
+    yield check_compressed_roundtrip, '.bz2', 'BZh'
+
+def test_atomic_write():
+    path = os.path.join(_tmpdir, 'atomic.csv')
+    sc.write_list([['a'], ['1']], path, atomic=True, fsync=True,
+            buffering=1 << 16)
+    nt.assert_equal(sc.read_to_list(path), [['a'], ['1']])
+    def failing():
+        yield {'a': 2}
+        raise RuntimeError("boom")
+    nt.assert_raises(RuntimeError, sc.write_dict_stream, failing(), path,
+            atomic=True, batch_size=1)
+    # the old file survives and no temporary files are left behind
+    nt.assert_equal(sc.read_to_list(path), [['a'], ['1']])
+    nt.assert_equal([name for name in os.listdir(_tmpdir)
+                     if name.endswith('.tmp')], [])
+
+def test_atomic_write_permissions():
+    import stat
+    path = os.path.join(_tmpdir, 'mode.csv')
+    sc.write_list([['a']], path, atomic=True)
+    mask = os.umask(0)
+    os.umask(mask)
+    nt.assert_equal(stat.S_IMODE(os.stat(path).st_mode), 0666 & ~mask)
+    # replacing a file keeps its permissions
+    os.chmod(path, 0600)
+    sc.write_list([['b']], path, atomic=True)
+    nt.assert_equal(stat.S_IMODE(os.stat(path).st_mode), 0600)
+
+def test_failed_atomic_writes_raise():
+    path = os.path.join(_tmpdir, 'failed.csv')
+    sc.write_list([['a'], ['1']], path, atomic=True)
+    # an invalid quoting only fails once the writer is made
+    nt.assert_raises(TypeError, sc.write_list, [['a'], [2]], path,
+            atomic=True, quoting=99)
+    nt.assert_raises(TypeError, sc.write_dict, [{'a': 2}], path,
+            atomic=True, quoting=99)
+    nt.assert_equal(sc.read_to_list(path), [['a'], ['1']])
+
+def test_write_dict_record_table():
+    table = RecordTable.from_dicts([dict(a=1, b='x'), dict(a=2)])
+    path = os.path.join(_tmpdir, 'table.csv')
+    sc.write_dict(table, path)
+    nt.assert_equal(open(path, 'rb').read(), 'a,b\r\n1,x\r\n2,\r\n')
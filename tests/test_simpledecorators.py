@@ -1,4 +1,13 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
 import nose.tools as nt
+from nose import SkipTest
 from simpleutils import simpledecorators as sd
 from simpleutils import simplecsv as sc
 from simpleutils import simpletime as st
@@ -154,3 +163,280 @@ def dumpargs_argnames_test():
     banana(1,2,c=4,d=False)
     banana(a=1,b=2,c=3,d=4)
 
+
+# memo
+def test_memo_bare_and_kwargs():
+    calls = []
+    @sd.memo
+    def add(a, b=0):
+        calls.append((a, b))
+        return a + b
+    nt.assert_equal([add(1), add(1), add(1, b=2), add(1, b=2)], [1, 1, 3, 3])
+    nt.assert_equal(calls, [(1, 0), (1, 2)])
+    nt.assert_equal(add.__name__, 'add')
+    nt.assert_equal(add.cache_info(), sd.CacheInfo(2, 2, None, 2))
+    add.cache_clear()
+    nt.assert_equal(add.cache_info(), sd.CacheInfo(0, 0, None, 0))
+
+def test_memo_unhashable_args():
+    @sd.memo
+    def total(values):
+        return sum(values)
+    # run uncached, with the right arguments
+    nt.assert_equal(total([1, 2]), 3)
+    nt.assert_equal(total.cache_info().currsize, 0)
+    @sd.memo(key=lambda args, kwargs: tuple(args[0]))
+    def total2(values):
+        return sum(values)
+    nt.assert_equal((total2([1, 2]), total2([1, 2])), (3, 3))
+    nt.assert_equal(total2.cache_info().hits, 1)
+
+def test_memo_maxsize_and_ttl():
+    now = [0]
+    calls = []
+    @sd.memo(maxsize=2, ttl=10, timer=lambda: now[0])
+    def square(x):
+        calls.append(x)
+        return x * x
+    for x in (1, 2, 1, 3, 1, 2):
+        square(x)
+    # 2 was evicted as least recently used when 3 came in
+    nt.assert_equal(calls, [1, 2, 3, 2])
+    now[0] = 20
+    square(1)
+    nt.assert_equal(calls, [1, 2, 3, 2, 1])
+    nt.assert_equal(square.cache_info().maxsize, 2)
+
+@nt.raises(TypeError)
+def test_memo_positional_maxsize():
+    sd.memo(128)
+
+# coroutine functions. async syntax doesn't parse on python 2, so the
+# coroutines are compiled from source
+ASYNC_SOURCE = '''
+async def fetch(key):
+    calls.append(key)
+    await asyncio.sleep(0.01)
+    if key < 0:
+        raise ValueError(key)
+    return key * 2
+'''
+
+def _async_fetch(calls):
+    """ :returns: coroutine function fetch(key), recording keys in calls"""
+    if sd.asyncio is None:
+        raise SkipTest("needs asyncio")
+    namespace = {'asyncio': sd.asyncio, 'calls': calls}
+    exec(ASYNC_SOURCE, namespace)
+    return namespace['fetch']
+
+def _run(loop, make_awaitable):
+    """ runs make_awaitable() inside loop (so tasks can be created) and
+    returns its result"""
+    namespace = {}
+    exec('async def run(make):\n    return await make()\n', namespace)
+    return loop.run_until_complete(namespace['run'](make_awaitable))
+
+def test_memo_coroutine_shares_one_task():
+    calls = []
+    fetch = sd.memo(_async_fetch(calls))
+    loop = sd.asyncio.new_event_loop()
+    try:
+        gathered = _run(loop, lambda: sd.asyncio.gather(fetch(1), fetch(1),
+            fetch(2)))
+        nt.assert_equal(gathered, [2, 2, 4])
+        nt.assert_equal(_run(loop, lambda: fetch(1)), 2)
+    finally:
+        loop.close()
+    nt.assert_equal(calls, [1, 2])
+    nt.assert_equal(fetch.cache_info(), sd.CacheInfo(2, 2, None, 2))
+
+def test_memo_coroutine_failures_are_retried():
+    calls = []
+    fetch = sd.memo(_async_fetch(calls))
+    loop = sd.asyncio.new_event_loop()
+    try:
+        for attempt in range(2):
+            nt.assert_raises(ValueError, _run, loop, lambda: fetch(-1))
+    finally:
+        loop.close()
+    nt.assert_equal(calls, [-1, -1])
+    nt.assert_equal(fetch.cache_info().currsize, 0)
+
+def test_catch_exceptions_coroutine():
+    handled = []
+    def handler(**kwargs):
+        handled.append(kwargs['exception'])
+        return 'handled'
+    fetch = sd.catch_exceptions(ValueError, handler_func=handler)(
+            _async_fetch([]))
+    loop = sd.asyncio.new_event_loop()
+    try:
+        nt.assert_equal(_run(loop, lambda: fetch(3)), 6)
+        nt.assert_equal(_run(loop, lambda: fetch(-1)), 'handled')
+    finally:
+        loop.close()
+    nt.assert_equal([type(e) for e in handled], [ValueError])
+
+def test_memo_over_catch_exceptions_coroutine():
+    calls = []
+    fetch = sd.catch_exceptions(KeyError)(_async_fetch(calls))
+    nt.assert_true(sd.asyncio.iscoroutinefunction(fetch))
+    fetch = sd.memo(fetch)
+    nt.assert_true(sd.asyncio.iscoroutinefunction(fetch))
+    loop = sd.asyncio.new_event_loop()
+    try:
+        nt.assert_equal(_run(loop, lambda: sd.asyncio.gather(fetch(1),
+            fetch(1))), [2, 2])
+        # ValueError isn't caught, and the failure isn't cached
+        for attempt in range(2):
+            nt.assert_raises(ValueError, _run, loop, lambda: fetch(-1))
+    finally:
+        loop.close()
+    nt.assert_equal(calls, [1, -1, -1])
+
+# persistent_memo
+_memo_dir = tempfile.mkdtemp()
+_memo_path = os.path.join(_memo_dir, 'memo.sqlite')
+_slow_calls = []
+
+@sd.persistent_memo(path=_memo_path)
+def slow_double(x, factor=2):
+    _slow_calls.append(x)
+    return {'value': x * factor}
+
+def teardown_module():
+    shutil.rmtree(_memo_dir)
+
+def test_persistent_memo_across_processes():
+    slow_double.cache_clear()
+    # computed and stored by another process...
+    child = multiprocessing.Process(target=slow_double, args=(21,))
+    child.start()
+    child.join()
+    # ...and only read back here
+    nt.assert_equal(slow_double(21), {'value': 42})
+    nt.assert_equal(_slow_calls, [])
+    nt.assert_equal(slow_double(21, factor=3), {'value': 63})
+    nt.assert_equal(_slow_calls, [21])
+    info = slow_double.cache_info()
+    nt.assert_equal((info.hits, info.misses, info.currsize), (1, 1, 2))
+
+def test_persistent_memo_versions_and_eviction():
+    path = os.path.join(_memo_dir, 'versions.sqlite')
+    calls = []
+    def make(version):
+        @sd.persistent_memo(path=path, version=version, maxsize=2)
+        def square(x):
+            calls.append(x)
+            return x * x
+        return square
+    square = make(1)
+    for x in (1, 2, 3):
+        square(x)
+    # 1 was least recently used
+    nt.assert_equal(square.cache_info().currsize, 2)
+    square(1)
+    nt.assert_equal(calls, [1, 2, 3, 1])
+    # a new version doesn't see the old results
+    make(2)(3)
+    nt.assert_equal(calls, [1, 2, 3, 1, 3])
+
+def test_memo_store_lru_and_totals():
+    big = 'x' * 500
+    store = sd._MemoStore(os.path.join(_memo_dir, 'store.sqlite'),
+            maxsize=3, access_resolution=0, access_batch=1,
+            maxbytes=len(sd.pickle.dumps(big, sd.pickle.HIGHEST_PROTOCOL)))
+    for key in 'abc':
+        store.set(key, 'f', key)
+    time.sleep(0.01)
+    nt.assert_equal(store.get('a'), (True, 'a'))
+    # b is now least recently used
+    store.set('d', 'f', 'd')
+    nt.assert_equal(store.get('b'), (False, None))
+    nt.assert_equal(store.count('f'), 3)
+    # a value as big as maxbytes pushes out the three others
+    store.set('big', 'g', big)
+    nt.assert_equal([store.get(key)[0] for key in 'acd'], [False] * 3)
+    totals = store.connection().execute(
+            'SELECT count, size FROM memo_totals').fetchone()
+    nt.assert_equal(totals[0], 1)
+    store.clear('g')
+    nt.assert_equal(tuple(store.connection().execute(
+        'SELECT count, size FROM memo_totals').fetchone()), (0, 0))
+
+def _accessed(store, key):
+    return store.connection().execute('SELECT accessed FROM memo WHERE '
+            'key = ?', (key,)).fetchone()[0]
+
+def test_memo_store_reader_writes_access_times():
+    path = os.path.join(_memo_dir, 'reader.sqlite')
+    sd._MemoStore(path).set('a', 'f', 1)
+    written = _accessed(sd._MemoStore(path), 'a')
+    # a store that only reads, with hits batched
+    reader = sd._MemoStore(path, access_resolution=0.05, access_batch=100)
+    time.sleep(0.06)
+    # the first stale hit is written straight away...
+    reader.get('a')
+    first = _accessed(reader, 'a')
+    nt.assert_true(first > written)
+    # ...later ones once access_resolution has passed since
+    reader.get('a')
+    nt.assert_equal(_accessed(reader, 'a'), first)
+    time.sleep(0.06)
+    reader.get('a')
+    nt.assert_true(_accessed(reader, 'a') > first)
+    # and the rest on flush
+    reader.access_resolution = 0
+    reader._flushed = time.time() + 60
+    reader.get('a')
+    pending = reader._accessed['a']
+    reader.flush()
+    nt.assert_equal(_accessed(reader, 'a'), pending)
+
+def _set_same_keys(path, start):
+    start.wait()
+    store = sd._MemoStore(path)
+    for i in range(50):
+        store.set(str(i), 'f', i)
+
+def test_memo_store_concurrent_inserts_keep_totals():
+    path = os.path.join(_memo_dir, 'race.sqlite')
+    sd._MemoStore(path).connection()
+    start = multiprocessing.Event()
+    procs = [multiprocessing.Process(target=_set_same_keys, args=(path, start))
+             for _ in range(4)]
+    for p in procs:
+        p.start()
+    start.set()
+    for p in procs:
+        p.join()
+    conn = sd._MemoStore(path).connection()
+    nt.assert_equal(conn.execute('SELECT count FROM memo_totals').fetchone(),
+            (50,))
+
+def test_function_version_changes_with_code():
+    def one():
+        return 1
+    def other():
+        return 2
+    nt.assert_not_equal(sd.function_version(one), sd.function_version(other))
+
+GENEXPR_SOURCE = """
+def total(xs):
+    return sum(x * 2 for x in xs if x not in {'a', 'b', 'c'})
+"""
+
+def test_function_version_is_stable_across_interpreters():
+    namespace = {}
+    exec(GENEXPR_SOURCE, namespace)
+    # a fresh interpreter, not a fork, so nothing shares memory addresses
+    script = ('from simpleutils.simpledecorators import function_version\n'
+              'namespace = {}\n'
+              'exec(%r, namespace)\n'
+              'print(function_version(namespace["total"]))\n' % GENEXPR_SOURCE)
+    env = dict(os.environ, PYTHONHASHSEED='random')
+    for attempt in range(2):
+        out = subprocess.check_output([sys.executable, '-c', script], env=env)
+        nt.assert_equal(out.decode('ascii').strip(),
+                sd.function_version(namespace['total']))
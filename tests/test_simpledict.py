@@ -0,0 +1,219 @@
+import threading
+import time
+
+import nose.tools as nt
+from nose import SkipTest
+from simpleutils import simpledict as sdict
+
+ROWS = [dict(a=1, b=2), dict(b=3, c=4), dict(a=5)]
+
+def test_dicts_to_list_fills_missing_keys():
+    names, data = sdict.dicts_to_list(ROWS)
+    nt.assert_equal(names, ('a', 'b', 'c'))
+    nt.assert_equal(data, [[1, 2, None], [None, 3, 4], [5, None, None]])
+
+def test_dicts_to_list_fieldnames_and_ignore_keys():
+    names, data = sdict.dicts_to_list(ROWS, fieldnames=['c', 'b'],
+            ignore_keys=['b'])
+    nt.assert_equal(names, ('c', 'a'))
+    nt.assert_equal(data, [[None, 1], [4, None], [None, 5]])
+
+def test_dicts_to_list_dense_and_single_column():
+    dense = [dict(x=i, y=-i) for i in range(3)]
+    nt.assert_equal(sdict.dicts_to_list(dense)[1], [[0, 0], [1, -1], [2, -2]])
+    names, data = sdict.dicts_to_list(dense, ignore_keys=['y'])
+    nt.assert_equal(data, [[0], [1], [2]])
+
+def test_dicts_to_list_generator_and_column_major():
+    names, columns = sdict.dicts_to_list(iter(ROWS), column_major=True)
+    nt.assert_equal(names, ('a', 'b', 'c'))
+    nt.assert_equal(columns, [[1, None, 5], [2, 3, None], [None, 4, None]])
+
+def test_dicts_to_list_empty():
+    nt.assert_equal(sdict.dicts_to_list([]), ((), []))
+
+def test_record_table_from_dicts():
+    table = sdict.RecordTable.from_dicts(iter(ROWS))
+    nt.assert_equal(table.fieldnames, ('a', 'b', 'c'))
+    nt.assert_equal(len(table), 3)
+    nt.assert_equal(table.to_dicts(), [dict(a=1, b=2, c=None),
+        dict(a=None, b=3, c=4), dict(a=5, b=None, c=None)])
+    nt.assert_equal(dict(table[1]), dict(a=None, b=3, c=4))
+    nt.assert_equal(table[-1].get('a'), 5)
+    nt.assert_raises(KeyError, lambda: table[0]['z'])
+    nt.assert_raises(IndexError, lambda: table[3])
+
+def test_record_table_compacts_columns():
+    table = sdict.RecordTable(['i', 'f', 's'],
+            [[1, 2], [1.5, 2.0], ['x', 'y']])
+    nt.assert_equal([getattr(col, 'typecode', None) for col in table.columns],
+            ['l', 'd', None])
+    # values that don't fit an array turn the column back into a list
+    table.append(dict(i=None, f=3.0, s='z'))
+    nt.assert_equal(list(table.column('i')), [1, 2, None])
+    nt.assert_equal(table[1:].to_dicts(),
+            [dict(i=2, f=2.0, s='y'), dict(i=None, f=3.0, s='z')])
+
+def test_record_table_append_keeps_types():
+    table = sdict.RecordTable(['i', 'f'], [[1, 2], [1.5, 2.5]])
+    table.append(dict(i=True, f=2))
+    nt.assert_equal([type(value) for value in table.column('i')],
+            [int, int, bool])
+    nt.assert_equal([type(value) for value in table.column('f')],
+            [float, float, int])
+    nt.assert_false(hasattr(table.column('f'), 'typecode'))
+    # values of the right type stay in the array
+    table = sdict.RecordTable(['i'], [[1]])
+    table.append(dict(i=2))
+    nt.assert_equal(table.column('i').typecode, 'l')
+
+def test_record_table_without_fieldnames_counts_rows():
+    table = sdict.RecordTable.from_dicts([{}, {}])
+    nt.assert_equal(len(table), 2)
+    table.append({})
+    nt.assert_equal(table.to_dicts(), [{}, {}, {}])
+    nt.assert_equal(len(table[1:]), 2)
+    # columns added later are padded for the rows so far
+    table.append(dict(a=1))
+    nt.assert_equal(list(table.column('a')), [None, None, None, 1])
+    nt.assert_equal(len(sdict.RecordTable.from_rows([(), ()], ())), 2)
+
+def test_record_table_namedtuples_and_dicts_to_list():
+    table = sdict.RecordTable.from_dicts(ROWS)
+    back = sdict.RecordTable.from_namedtuples(table.to_namedtuples())
+    nt.assert_equal(back.to_dicts(), table.to_dicts())
+    names, data = sdict.dicts_to_list(table, fieldnames=['c'],
+            ignore_keys=['a'])
+    nt.assert_equal(names, ('c', 'b'))
+    nt.assert_equal(data, [[None, 2], [4, 3], [None, None]])
+
+def test_dicts_to_namedtuples_reuses_classes():
+    first = sdict.dicts_to_namedtuples(ROWS, 'Row')
+    second = sdict.dicts_to_namedtuples(ROWS[1:], 'Row', fieldnames=['a'])
+    nt.assert_true(first[0].__class__ is second[0].__class__)
+    nt.assert_equal(first[1], (None, 3, 4))
+    nt.assert_equal(first[1].c, 4)
+
+def test_dicts_to_namedtuples_lazy_and_numbers():
+    rows = sdict.dicts_to_namedtuples(iter([{'1': 'x', 'b': 2}, {'b': 3}]),
+            lazy=True)
+    nt.assert_false(isinstance(rows, list))
+    rows = list(rows)
+    nt.assert_equal(rows[0]._fields, ('f1', 'b'))
+    nt.assert_equal([tuple(row) for row in rows], [('x', 2), (None, 3)])
+    lazy = list(sdict.dicts_to_namedtuples(ROWS, lazy=True))
+    nt.assert_equal(lazy, sdict.dicts_to_namedtuples(ROWS))
+
+def _run_threads(target, args_list):
+    threads = [threading.Thread(target=target, args=args)
+               for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_concurrent_dict_single_flight():
+    calls = []
+    def slow(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return key * 2
+    d = sdict.concurrentdefaultfunctiondict(slow)
+    results = []
+    _run_threads(lambda key: results.append(d[key]), [(3,)] * 8)
+    nt.assert_equal(calls, [3])
+    nt.assert_equal(results, [6] * 8)
+    # different keys don't wait for each other
+    start = time.time()
+    _run_threads(lambda key: d[key], [(k,) for k in range(4)])
+    nt.assert_true(time.time() - start < 0.15)
+    nt.assert_equal(sorted(calls), [0, 1, 2, 3])
+
+def test_concurrent_dict_errors_are_shared_and_retried():
+    attempts = []
+    def failing(key):
+        attempts.append(key)
+        time.sleep(0.05)
+        if len(attempts) == 1:
+            raise ValueError(key)
+        return key
+    d = sdict.concurrentdefaultfunctiondict(failing)
+    errors = []
+    def get(key):
+        try:
+            d[key]
+        except ValueError as e:
+            errors.append(e)
+    _run_threads(get, [('k',)] * 4)
+    nt.assert_equal((len(attempts), len(errors)), (1, 4))
+    nt.assert_equal(d['k'], 'k')
+
+def test_async_dict_shares_one_task():
+    asyncio = sdict.asyncio
+    if asyncio is None:
+        raise SkipTest("needs asyncio")
+    loop = asyncio.new_event_loop()
+    calls = []
+    def factory(key):
+        # a future stands in for a coroutine (no async syntax on python 2)
+        calls.append(key)
+        future = loop.create_future()
+        loop.call_later(0.01, future.set_result, key * 2)
+        return future
+    d = sdict.asyncdefaultfunctiondict(factory)
+    try:
+        gathered = asyncio.gather(d[1], d[1], d[2])
+        nt.assert_equal(loop.run_until_complete(gathered), [2, 2, 4])
+    finally:
+        loop.close()
+    nt.assert_equal(calls, [1, 2])
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_bounded_dict_lru_and_stats():
+    d = sdict.boundeddefaultfunctiondict(lambda key: key * 10, maxsize=2)
+    nt.assert_equal((d[1], d[2], d[1], d[3]), (10, 20, 10, 30))
+    # 2 was least recently used
+    nt.assert_equal(sorted(d), [1, 3])
+    nt.assert_equal(d[2], 20)
+    stats = d.stats()
+    nt.assert_equal((stats.hits, stats.misses, stats.evictions,
+        stats.currsize), (1, 4, 2, 2))
+    nt.assert_equal(d.hit_rate(), 0.2)
+    nt.assert_equal(d.get(99), None)
+    nt.assert_equal(d.stats().misses, 4)
+
+def test_bounded_dict_ttl():
+    timer = FakeTimer()
+    calls = []
+    def factory(key):
+        calls.append(key)
+        return key
+    d = sdict.boundeddefaultfunctiondict(factory, ttl=10, timer=timer)
+    d['a']
+    timer.now = 5
+    d['a']
+    nt.assert_true('a' in d)
+    timer.now = 11
+    nt.assert_false('a' in d)
+    d['a']
+    nt.assert_equal(calls, ['a', 'a'])
+    nt.assert_equal(d.stats().expirations, 1)
+    d['b']
+    timer.now = 30
+    d.purge()
+    nt.assert_equal((len(d), d.stats().expirations), (0, 3))
+
+def test_bounded_dict_maxmemory():
+    d = sdict.boundeddefaultfunctiondict(lambda key: 'x' * 100,
+            maxmemory=250, sizeof=lambda key, value: len(value))
+    for key in range(5):
+        d[key]
+    nt.assert_equal((sorted(d), d.nbytes, d.stats().evictions),
+            ([3, 4], 200, 3))
+    del d[3]
+    nt.assert_equal(d.nbytes, 100)
@@ -0,0 +1,40 @@
+import nose.tools as nt
+from simpleutils import simpleindex as si
+
+ORDERS = [dict(id=1, customer='a', total=5),
+          dict(id=2, customer='b', total=7),
+          dict(id=3, customer='a', total=1)]
+CUSTOMERS = [dict(customer='a', name='Ann'), dict(customer='c', name='Cy')]
+
+def test_hash_index_groups_references():
+    index = si.HashIndex(iter(ORDERS), 'customer')
+    nt.assert_equal(len(index), 2)
+    nt.assert_equal([row['id'] for row in index['a']], [1, 3])
+    nt.assert_true(index['a'][0] is ORDERS[0])
+    nt.assert_equal(index['zzz'], ())
+    nt.assert_equal(index.first('b'), ORDERS[1])
+    nt.assert_equal(index.counts(), {'a': 2, 'b': 1})
+
+def test_multi_column_and_unique_index():
+    index = si.HashIndex(ORDERS, ['customer', 'total'])
+    nt.assert_equal(index['a', 1], [ORDERS[2]])
+    nt.assert_equal(index.lookup(dict(customer='b', total=7)), [ORDERS[1]])
+    nt.assert_raises(ValueError, si.HashIndex, ORDERS, 'customer',
+            unique=True)
+
+def test_inner_join_streams_left():
+    rows = si.hash_join(iter(ORDERS), CUSTOMERS, on='customer')
+    nt.assert_equal(list(rows), [dict(ORDERS[0], name='Ann'),
+        dict(ORDERS[2], name='Ann')])
+
+def test_left_join_and_right_on():
+    customers = [dict(cid='a', name='Ann')]
+    rows = list(si.left_join(ORDERS, customers, on='customer',
+        right_on='cid', merge=lambda left, right: (left['id'],
+            right['name'])))
+    nt.assert_equal(rows, [(1, 'Ann'), (2, None), (3, 'Ann')])
+    merged = list(si.left_join(ORDERS[1:2], customers, on='customer',
+        right_on='cid'))
+    nt.assert_equal(merged, [dict(ORDERS[1], cid=None, name=None)])
+    nt.assert_raises(ValueError, si.hash_join, ORDERS, CUSTOMERS,
+            'customer', how='outer')
@@ -0,0 +1,25 @@
+import nose.tools as nt
+from simpleutils import simplesets as ss
+
+DICTS = [dict(a=1, b=2), dict(b=3), dict(c=4, b=5)]
+
+def test_get_all_keys_any_iterable():
+    nt.assert_equal(ss.get_all_keys(DICTS), set('abc'))
+    nt.assert_equal(ss.get_all_keys(iter(DICTS), chunk_size=2), set('abc'))
+    nt.assert_equal(ss.get_all_keys(dict(x=1)), set('x'))
+    nt.assert_equal(ss.get_all_keys(iter(DICTS), sample_size=2), set('ab'))
+
+def test_get_all_keys_counts():
+    counts = ss.get_all_keys(iter(DICTS), counts=True)
+    nt.assert_equal(counts['b'], 3)
+    nt.assert_equal(counts['c'], 1)
+    nt.assert_equal(list(counts)[2], 'c')
+
+def test_get_all_keys_parallel():
+    dicts = [dict([(i % 7, i)]) for i in range(100)] + [dict(last=1)]
+    nt.assert_equal(ss.get_all_keys(dicts, processes=2, chunk_size=10),
+            ss.get_all_keys(dicts))
+    counts = ss.get_all_keys(iter(dicts), counts=True, processes=2,
+            chunk_size=10)
+    nt.assert_equal(counts, ss.get_all_keys(dicts, counts=True))
+    nt.assert_equal(list(counts), range(7) + ['last'])
@@ -0,0 +1,266 @@
+import os
+import shutil
+import tempfile
+
+import nose.tools as nt
+from nose import SkipTest
+try:
+    from simpleutils import simplexls as sx
+except ImportError:
+    raise SkipTest("simplexls needs openpyxl")
+from simpleutils import simplecsv as sc
+
+_tmpdir = None
+
+def setup():
+    global _tmpdir
+    _tmpdir = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(_tmpdir)
+
+def path_to(name):
+    return os.path.join(_tmpdir, name)
+
+def make_csv(text, name='test.csv'):
+    path = path_to(name)
+    with open(path, 'wb') as f:
+        f.write(text)
+    return path
+
+# csv_to_xlsx / xlsx_to_csv
+PRECISE_CSV = 'a,b\r\n1.2345678901234567,x\r\n0.1234567890123456,y\r\n3,z\r\n'
+
+def test_csv_to_xlsx_keeps_float_digits():
+    path = sx.csv_to_xlsx(make_csv(PRECISE_CSV), path_to('precise.xlsx'))
+    rows = list(sx.iter_sheet(path))
+    nt.assert_equal(rows[0], (u'a', u'b'))
+    nt.assert_equal([row[0] for row in rows[1:]],
+            [1.2345678901234567, 0.1234567890123456, 3])
+
+def test_xlsx_to_csv_roundtrip():
+    xlsx = sx.csv_to_xlsx(make_csv(PRECISE_CSV), path_to('roundtrip.xlsx'))
+    csvfile = sx.xlsx_to_csv(xlsx, path_to('roundtrip.csv'))
+    nt.assert_equal(open(csvfile, 'rb').read(), PRECISE_CSV)
+    # untyped, values are written as python writes them
+    sx.xlsx_to_csv(xlsx, csvfile, types=False)
+    nt.assert_equal(sc.read_to_list(csvfile)[1:],
+            [['1.2345678901234567', 'x'], ['0.1234567890123456', 'y'],
+             ['3.0', 'z']])
+
+def test_csv_to_xlsx_types():
+    import datetime
+    path = make_csv('n,d,s\r\n1,2012-08-09,x\r\n2,,y\r\n', 'types.csv')
+    xlsx = sx.csv_to_xlsx(path, path_to('types.xlsx'), sheet_name='data')
+    nt.assert_equal(list(sx.iter_sheet(xlsx, 'data', as_dicts=True)),
+            [{'n': 1, 'd': datetime.datetime(2012, 8, 9), 's': 'x'},
+             {'n': 2, 'd': None, 's': 'y'}])
+    xlsx = sx.csv_to_xlsx(path, path_to('text.xlsx'), types=False)
+    nt.assert_equal(list(sx.iter_sheet(xlsx))[1], (u'1', u'2012-08-09', u'x'))
+
+# write_dict_stream
+def test_write_dict_generator_matches_list():
+    rows = [dict(a=i, b=i / 3.0) for i in range(1200)] + [dict(c='late')]
+    listed = path_to('listed.xlsx')
+    sx.write_dict(rows, listed, sheet_name='data')
+    streamed = path_to('streamed.xlsx')
+    sx.write_dict(iter(rows), streamed, sheet_name='data')
+    nt.assert_equal(list(sx.iter_sheet(streamed, 'data')),
+            list(sx.iter_sheet(listed, 'data')))
+    last = list(sx.iter_sheet(streamed, 'data', as_dicts=True))[-1]
+    nt.assert_equal(last, {'a': None, 'b': None, 'c': 'late'})
+
+def test_write_dict_stream_sample_size():
+    rows = [dict(a=1.2345678901234567), dict(a=2, b='x')]
+    path = path_to('sampled.xlsx')
+    sx.write_dict_stream(iter(rows), path, sample_size=1,
+            col_titles=['A'], extrasaction='ignore')
+    nt.assert_equal(list(sx.iter_sheet(path)),
+            [(u'A',), (1.2345678901234567,), (2,)])
+
+def test_write_dict_stream_extrasaction():
+    rows = [dict(a=1), dict(a=2, b='late')]
+    path = path_to('extras.xlsx')
+    nt.assert_raises(ValueError, sx.write_dict_stream, iter(rows), path,
+            sample_size=1)
+    # keys given to ignore are fine
+    sx.write_dict_stream(iter(rows), path, sample_size=1, ignore_keys=['b'])
+    sx.write_dict_stream(iter(rows), path, sample_size=1,
+            extrasaction='ignore')
+    nt.assert_equal(list(sx.iter_sheet(path)), [(u'a',), (1,), (2,)])
+    nt.assert_raises(ValueError, sx.write_dict_stream, iter(rows), path,
+            extrasaction='drop')
+
+# iter_sheet / read_styles
+SHEET_ROWS = [dict(name='x', n=1, f=0.5), dict(name='y', n=2),
+              dict(name='z', n=3, f=1.5)]
+
+def make_sheet(name='sheet.xlsx', **kwargs):
+    path = path_to(name)
+    sx.write_dict(SHEET_ROWS, path, sheet_name='data', **kwargs)
+    return path
+
+def test_iter_sheet():
+    path = make_sheet()
+    nt.assert_equal(list(sx.iter_sheet(path, 'data')),
+            [(u'f', u'n', u'name'), (0.5, 1, u'x'), (None, 2, u'y'),
+             (1.5, 3, u'z')])
+    nt.assert_equal(list(sx.iter_sheet(path, 'data', as_dicts=True)),
+            SHEET_ROWS[:1] + [dict(name='y', n=2, f=None)] + SHEET_ROWS[2:])
+
+def test_iter_sheet_ranges_and_usecols():
+    path = make_sheet()
+    nt.assert_equal(list(sx.iter_sheet(path, 'data', min_row=3, max_row=4)),
+            [(None, 2, u'y'), (1.5, 3, u'z')])
+    # titles, letters and indexes, in the order given
+    nt.assert_equal(list(sx.iter_sheet(path, 'data', usecols=['name', 'B'],
+        max_row=3)), [(u'name', u'n'), (u'x', 1), (u'y', 2)])
+    nt.assert_equal(list(sx.iter_sheet(path, 'data', usecols=[2],
+        as_dicts=True, min_row=4)), [{'name': 'z'}])
+
+def test_read_styles():
+    bold = sx.Style()
+    bold.font.bold = True
+    red = sx.Style()
+    red.fill.fill_type = 'solid'
+    red.fill.start_color.index = 'FFFF0000'
+    path = make_sheet('styled.xlsx', row_styles={0: bold},
+            style_dict={'B3': red})
+    styles = sx.read_styles(path, 'A1:C3', 'data')
+    nt.assert_equal(sorted(styles), ['A1', 'B1', 'B3', 'C1', 'default'])
+    nt.assert_true(styles['A1'].font.bold)
+    nt.assert_equal(repr(styles['C1']), repr(bold))
+    nt.assert_equal(styles['B3'].fill.start_color.index, 'FFFF0000')
+    # only the cells asked for
+    nt.assert_equal(sorted(sx.read_styles(path, 'B:B', 'data')),
+            ['B1', 'B3', 'default'])
+
+# style interning and ranges
+def test_cell_range():
+    nt.assert_equal(sx.cell_range((2, 1), 10, 5), (2, 1, 3, 2))
+    nt.assert_equal(sx.cell_range('B1', 10, 5), (0, 1, 1, 2))
+    nt.assert_equal(sx.cell_range('A2:C4', 10, 5), (1, 0, 4, 3))
+    nt.assert_equal(sx.cell_range('B:D', 10, 5), (0, 1, 10, 4))
+    nt.assert_equal(sx.cell_range('2:3', 10, 5), (1, 0, 3, 5))
+    # clipped to the sheet
+    nt.assert_equal(sx.cell_range('$D$8:AA100', 10, 5), (7, 3, 10, 5))
+    nt.assert_raises(ValueError, sx.cell_range, '1A', 10, 5)
+
+def make_styles():
+    """ a bold style and a filled one"""
+    bold = sx.Style()
+    bold.font.bold = True
+    filled = sx.Style()
+    filled.fill.fill_type = 'solid'
+    filled.fill.start_color.index = 'FFDDDDDD'
+    return bold, filled
+
+def test_style_cache():
+    bold, filled = make_styles()
+    cache = sx.StyleCache()
+    joined = cache(bold, filled)
+    # each part (font, fill, ...) comes from the column style if it sets it
+    nt.assert_true(joined.font.bold)
+    nt.assert_equal(joined.fill.fill_type, 'solid')
+    nt.assert_true(cache(bold, filled) is joined)
+    nt.assert_true(cache(bold) is bold)
+    nt.assert_equal(len(cache), 2)
+
+def test_apply_styles():
+    bold, filled = make_styles()
+    red = sx.Style()
+    red.font.color.index = 'FFFF0000'
+    cells = {}
+    def set_style(i, j, style):
+        cells[i, j] = style
+    cache = sx._apply_styles(None, 3, 3, {0: bold}, {1: filled},
+            {'C2:C3': red}, None, set_style=set_style)
+    nt.assert_equal(sorted(cells), [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2),
+        (2, 1), (2, 2)])
+    nt.assert_true(cells[0, 1].font.bold)
+    nt.assert_equal(cells[0, 1].fill.fill_type, 'solid')
+    nt.assert_true(cells[0, 0] is bold and cells[1, 1] is filled)
+    nt.assert_true(cells[2, 2] is red)
+    # one joined style, shared by every cell that needs it
+    nt.assert_true(cells[0, 1] is cache(bold, filled))
+
+def test_write_dict_styles_roundtrip():
+    bold, grey = make_styles()
+    path = make_sheet('ranges.xlsx', col_styles=[None, bold],
+            style_dict={'A3:C3': grey})
+    styles = sx.read_styles(path, 'A1:C4', 'data')
+    nt.assert_equal(sorted(styles), ['A3', 'B1', 'B2', 'B3', 'B4', 'C3',
+        'default'])
+    nt.assert_true(styles['B4'].font.bold)
+    nt.assert_equal(styles['B3'].fill.start_color.index, 'FFDDDDDD')
+
+# write_workbook
+def check_write_workbook(processes):
+    from collections import OrderedDict
+    bold, filled = make_styles()
+    sheets = OrderedDict([('first', SHEET_ROWS),
+                          ('second', iter([dict(x=1), dict(y=2.25)]))])
+    options = {'first': dict(fieldnames=['name'], row_styles={0: bold}),
+               'second': dict(col_titles=['X'], style_dict={'B3': filled})}
+    path = path_to('workbook%d.xlsx' % processes)
+    wb = sx.write_workbook(sheets, path, sheet_options=options,
+            processes=processes)
+    nt.assert_equal(wb.get_sheet_names(), ['first', 'second'])
+    nt.assert_equal(list(sx.iter_sheet(path, 'first')),
+            [(u'name', u'f', u'n'), (u'x', 0.5, 1), (u'y', None, 2),
+             (u'z', 1.5, 3)])
+    nt.assert_equal(list(sx.iter_sheet(path, 'second')),
+            [(u'X', u'y'), (1, None), (None, 2.25)])
+    nt.assert_equal(sorted(sx.read_styles(path, 'A1:C4', 'first')),
+            ['A1', 'B1', 'C1', 'default'])
+    nt.assert_equal(sorted(sx.read_styles(path, 'A1:B3', 'second')),
+            ['B3', 'default'])
+
+def test_write_workbook():
+    # in a pool and in this process
+    yield check_write_workbook, 2
+    yield check_write_workbook, 1
+
+@nt.raises(TypeError)
+def test_write_workbook_unknown_option():
+    sx.write_workbook({'a': SHEET_ROWS}, path_to('bad.xlsx'),
+            sheet_options={'a': dict(colour='red')})
+
+# atomic saves
+class FailingWorkbook(object):
+    def save(self, f):
+        f.write('partial')
+        raise RuntimeError("boom")
+
+def test_save_workbook_atomic():
+    path = make_sheet('atomic.xlsx', atomic=True, buffering=1 << 16)
+    before = open(path, 'rb').read()
+    nt.assert_raises(RuntimeError, sx.save_workbook, FailingWorkbook(), path,
+            atomic=True, fsync=True)
+    # the old workbook survives and no temporary files are left behind
+    nt.assert_equal(open(path, 'rb').read(), before)
+    nt.assert_equal(len(list(sx.iter_sheet(path, 'data'))), 4)
+    nt.assert_equal([name for name in os.listdir(_tmpdir)
+                     if name.endswith('.tmp')], [])
+
+# progress
+def test_progress_callbacks():
+    seen = []
+    make_sheet('progress.xlsx', progress=seen.append,
+            default_style=sx.Style())
+    last = seen[-1]
+    # 4 rows x 3 columns written, then styled
+    nt.assert_equal((last.label, last.unit, last.done),
+            ('write_dict', 'cells', True))
+    nt.assert_equal(last.count, 24)
+    del seen[:]
+    rows = list(sx.iter_sheet(path_to('progress.xlsx'), 'data',
+        progress=seen.append))
+    nt.assert_equal((seen[-1].label, seen[-1].count, seen[-1].done),
+            ('iter_sheet', len(rows), True))
+    del seen[:]
+    sx.csv_to_xlsx(make_csv(PRECISE_CSV, 'progress.csv'),
+            path_to('progress2.xlsx'), progress=seen.append)
+    nt.assert_equal((seen[-1].label, seen[-1].count), ('csv_to_xlsx', 4))
+    nt.assert_equal(seen[-1].nbytes,
+            os.path.getsize(path_to('progress2.xlsx')))